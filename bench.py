@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+from PIL import Image, ImageOps
+from PIL.TiffImagePlugin import IFDRational
+
+
+# Read and write syscall counters of this process (Linux only)
+def _proc_io() -> dict[str, int]:
+    try:
+        with open("/proc/self/io") as f:
+            return {
+                key: int(value)
+                for key, value in (line.split(": ") for line in f.read().splitlines())
+            }
+    except OSError:
+        return {}
+
+
+# Count subprocesses started while the block runs
+@contextmanager
+def _count_spawns() -> Iterator[list[int]]:
+    counter = [0]
+    original_init = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        counter[0] += 1
+        original_init(self, *args, **kwargs)
+
+    subprocess.Popen.__init__ = counting_init
+    try:
+        yield counter
+    finally:
+        subprocess.Popen.__init__ = original_init
+
+
+def _proc_status(key: str) -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{key}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# Peak memory use of the block above what the process held when it started, from
+# the kernel's resident-set high-water mark, which also sees allocations made in
+# C (Linux only; the result stays empty elsewhere). Freed memory is reused, so
+# only the first measurement in a process is meaningful.
+@contextmanager
+def _peak_rss() -> Iterator[dict[str, Any]]:
+    result: dict[str, Any] = {}
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = _proc_status("VmRSS")
+    except OSError:
+        before = None
+    yield result
+    peak = _proc_status("VmHWM")
+    if before is not None and peak is not None:
+        result["peak_rss_increase_mb"] = round((peak - before) / 1e6, 1)
+
+
+@contextmanager
+def _measure(file_count: int, byte_count: int) -> Iterator[dict[str, Any]]:
+    result: dict[str, Any] = {}
+    io_before = _proc_io()
+    with _count_spawns() as spawns:
+        start = time.perf_counter()
+        yield result
+        elapsed = time.perf_counter() - start
+    io_after = _proc_io()
+    syscalls = sum(
+        io_after.get(key, 0) - io_before.get(key, 0) for key in ("syscr", "syscw")
+    )
+    result.update(
+        seconds=round(elapsed, 4),
+        files_per_second=round(file_count / elapsed, 2) if elapsed else None,
+        mb_per_second=round(byte_count / elapsed / 1e6, 2) if elapsed else None,
+        read_write_syscalls_per_file=(
+            round(syscalls / file_count, 2) if io_before and file_count else None
+        ),
+        subprocess_spawns_per_file=(
+            round(spawns[0] / file_count, 3) if file_count else None
+        ),
+    )
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _dms(degrees: float) -> tuple[IFDRational, IFDRational, IFDRational]:
+    minutes, seconds = divmod(round(abs(degrees) * 360000), 6000)
+    return (
+        IFDRational(minutes // 60),
+        IFDRational(minutes % 60),
+        IFDRational(seconds, 100),
+    )
+
+
+def _jpeg_bytes(
+    taken: datetime.datetime, lat_lon: tuple[float, float] | None = None
+) -> bytes:
+    exif = Image.Exif()
+    exif.get_ifd(0x8769)[0x9003] = taken.strftime("%Y:%m:%d %H:%M:%S")
+    if lat_lon is not None:
+        lat, lon = lat_lon
+        gps_ifd = exif.get_ifd(0x8825)
+        gps_ifd[1] = "N" if lat >= 0 else "S"
+        gps_ifd[2] = _dms(lat)
+        gps_ifd[3] = "E" if lon >= 0 else "W"
+        gps_ifd[4] = _dms(lon)
+    output = BytesIO()
+    Image.new("RGB", (160, 120), (90, 120, 150)).save(
+        output, format="JPEG", exif=exif.tobytes(), quality=90
+    )
+    return output.getvalue()
+
+
+# A minimal Fujifilm RAF: the header, an embedded JPEG preview carrying the EXIF
+# data, and the payload standing in for the sensor data
+def _raf_bytes(jpeg: bytes, payload: bytes) -> bytes:
+    header = b"FUJIFILMCCD-RAW 0201FF383501".ljust(84, b"\x00")
+    jpeg_offset = len(header) + 8
+    return header + struct.pack(">II", jpeg_offset, len(jpeg)) + jpeg + payload
+
+
+# Lay out a synthetic camera card: JPEG+RAF pairs, orphans on both sides, and videos.
+# Returns the number of files and bytes written.
+def make_card(
+    card_dir: Path,
+    pairs: int,
+    orphan_jpegs: int,
+    orphan_raws: int,
+    videos: int,
+    raw_mb: float,
+    video_mb: float,
+    seed: int = 0,
+) -> tuple[int, int]:
+    source = card_dir / "100_FUJI"
+    source.mkdir(parents=True)
+    rng = random.Random(seed)
+    taken = datetime.datetime(2023, 10, 1, 11, 36, 11)
+    raw_payload = rng.randbytes(int(raw_mb * 1e6))
+    video_payload = rng.randbytes(int(video_mb * 1e6))
+    shot = 0
+
+    def next_stem() -> str:
+        nonlocal shot, taken
+        shot += 1
+        taken += datetime.timedelta(seconds=1)
+        return f"DSCF{shot:04d}"
+
+    for _ in range(pairs):
+        stem = next_stem()
+        jpeg = _jpeg_bytes(taken)
+        (source / f"{stem}.JPG").write_bytes(jpeg)
+        (source / f"{stem}.RAF").write_bytes(_raf_bytes(jpeg, raw_payload))
+    for _ in range(orphan_jpegs):
+        (source / f"{next_stem()}.JPG").write_bytes(_jpeg_bytes(taken))
+    for _ in range(orphan_raws):
+        stem = next_stem()
+        (source / f"{stem}.RAF").write_bytes(
+            _raf_bytes(_jpeg_bytes(taken), raw_payload)
+        )
+    for _ in range(videos):
+        (source / f"{next_stem()}.MOV").write_bytes(shot.to_bytes(4) + video_payload)
+
+    files = list(source.iterdir())
+    return len(files), sum(path.stat().st_size for path in files)
+
+
+def bench_import(args: argparse.Namespace) -> dict[str, Any]:
+    import_module = importlib.import_module("import")
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        tmp_path = Path(tmp)
+        file_count, byte_count = make_card(
+            tmp_path / "card",
+            args.pairs,
+            args.orphan_jpegs,
+            args.orphan_raws,
+            args.videos,
+            args.raw_mb,
+            args.video_mb,
+        )
+        source = tmp_path / "card" / "100_FUJI"
+        destination = tmp_path / "destination"
+        results: dict[str, Any] = {}
+        # The second run measures a re-import of a card that was already imported
+        for run in ("import", "reimport"):
+            with _measure(file_count, byte_count) as result:
+                import_module.copy_and_rename_files(
+                    source,
+                    destination / "photos",
+                    destination / "videos",
+                    [".raf"],
+                    [".mov"],
+                    report=False,
+                )
+            results[run] = result
+    return {
+        "files": file_count,
+        "bytes": byte_count,
+        "results": results,
+    }
+
+
+# What gps.lat_lon_from_metadata used to do: one exiv2 process per tag
+def _lat_lon_exiv2(path: Path) -> list[str]:
+    return [
+        subprocess.check_output(
+            ["exiv2", "-g", f"Exif.GPSInfo.{tag}", "-Pv", str(path)], text=True
+        )
+        for tag in ("GPSLatitude", "GPSLongitude", "GPSLatitudeRef", "GPSLongitudeRef")
+    ]
+
+
+def bench_gps(args: argparse.Namespace) -> dict[str, Any]:
+    gps = importlib.import_module("gps")
+    rng = random.Random(0)
+    taken = datetime.datetime(2023, 10, 1, 11, 36, 11)
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        paths = []
+        for i in range(args.images):
+            path = Path(tmp) / f"DSCF{i:04d}.JPG"
+            lat_lon = (rng.uniform(-90, 90), rng.uniform(-180, 180))
+            path.write_bytes(_jpeg_bytes(taken, lat_lon))
+            paths.append(path)
+        byte_count = sum(path.stat().st_size for path in paths)
+
+        readers = {"native": gps.lat_lon_from_metadata}
+        # The exiv2 baseline is only measured where exiv2 is installed
+        if shutil.which("exiv2"):
+            readers["exiv2"] = _lat_lon_exiv2
+        results: dict[str, Any] = {}
+        for name, reader in readers.items():
+            with _measure(len(paths), byte_count) as result:
+                for path in paths:
+                    reader(path)
+            result["ms_per_image"] = round(result["seconds"] / len(paths) * 1000, 4)
+            results[name] = result
+    return {"files": len(paths), "bytes": byte_count, "results": results}
+
+
+# How resizing worked before resize.downscale: full decode, rotate, then shrink
+def _downscale_full_decode(path: Path, max_dimension: int) -> Image.Image:
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    return img
+
+
+# Runs in a fresh process per measurement, so peak memory is not hidden by memory
+# an earlier measurement freed. Returns the measurement and the last output image.
+def _measure_downscale(
+    engine: str, path: Path, size: int, repeat: int
+) -> tuple[dict[str, Any], np.ndarray]:
+    if engine == "draft":
+        downscale = importlib.import_module("resize").downscale
+    else:
+        downscale = _downscale_full_decode
+    byte_count = path.stat().st_size
+    with _peak_rss() as memory:
+        with _measure(repeat, byte_count * repeat) as result:
+            for _ in range(repeat):
+                output = downscale(path, size)
+    result["ms_per_image"] = round(result["seconds"] / repeat * 1000, 2)
+    result.update(memory)
+    return result, np.asarray(output)
+
+
+def bench_resize(args: argparse.Namespace) -> dict[str, Any]:
+    width = int((args.megapixels * 1e6 * 3 / 2) ** 0.5)
+    height = width * 2 // 3
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        path = Path(tmp) / "DSCF0001.JPG"
+        # Noise over a gradient, so the JPEG has real detail to decode, rotated by
+        # EXIF like a portrait shot
+        noise = Image.effect_noise((width, height), 40)
+        gradient = Image.linear_gradient("L").resize((width, height))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.merge("RGB", (noise, gradient, noise.transpose(0))).save(
+            path, quality=90, exif=exif.tobytes()
+        )
+        del noise, gradient
+        byte_count = path.stat().st_size
+
+        results: dict[str, Any] = {}
+        spawn = multiprocessing.get_context("spawn")
+        for size in args.sizes:
+            outputs = {}
+            results[str(size)] = {}
+            for engine in ("full_decode", "draft"):
+                with ProcessPoolExecutor(1, mp_context=spawn) as executor:
+                    result, outputs[engine] = executor.submit(
+                        _measure_downscale, engine, path, size, args.repeat
+                    ).result()
+                results[str(size)][engine] = result
+            full, draft = outputs["full_decode"], outputs["draft"]
+            results[str(size)]["output_size"] = [draft.shape[1], draft.shape[0]]
+            # Mean per-channel difference on a 0-255 scale; single digits are
+            # invisible on a photo
+            if full.shape == draft.shape:
+                difference = np.abs(full.astype(np.int16) - draft.astype(np.int16))
+                results[str(size)]["mean_abs_difference"] = round(
+                    float(difference.mean()), 3
+                )
+    return {"width": width, "height": height, "bytes": byte_count, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark pupphoto and print the results as JSON."
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        help="Directory for temporary fixtures (defaults to the system temp dir).",
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    import_parser = subparsers.add_parser(
+        "import", help="Import a synthetic camera card with copy_and_rename_files."
+    )
+    import_parser.add_argument("--pairs", type=int, default=200)
+    import_parser.add_argument("--orphan-jpegs", type=int, default=10)
+    import_parser.add_argument("--orphan-raws", type=int, default=10)
+    import_parser.add_argument("--videos", type=int, default=5)
+    import_parser.add_argument("--raw-mb", type=float, default=1.0)
+    import_parser.add_argument("--video-mb", type=float, default=10.0)
+    import_parser.set_defaults(run=bench_import)
+
+    gps_parser = subparsers.add_parser(
+        "gps", help="Read GPS coordinates from synthetic JPEGs."
+    )
+    gps_parser.add_argument("--images", type=int, default=500)
+    gps_parser.set_defaults(run=bench_gps)
+
+    resize_parser = subparsers.add_parser(
+        "resize", help="Downscale a large synthetic JPEG with and without draft mode."
+    )
+    resize_parser.add_argument("--megapixels", type=float, default=40.0)
+    resize_parser.add_argument("--sizes", type=int, nargs="+", default=[600, 1600])
+    resize_parser.add_argument("--repeat", type=int, default=3)
+    resize_parser.set_defaults(run=bench_resize)
+
+    args = parser.parse_args()
+    output = {
+        "benchmark": args.benchmark,
+        "revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("benchmark", "run", "workdir")
+        },
+        **args.run(args),
+    }
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
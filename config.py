@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import asdict, dataclass, fields
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 import tomllib
 
 
@@ -37,6 +37,16 @@ class ImportConfig:
     video_destination: Path
     supported_raw_formats: list[str]
     supported_video_formats: list[str]
+    scan_workers: int = 4
+    metadata_workers: int = 8
+    copy_workers: int = 4
+    device_io_limit: int = 2
+    verify_workers: int = 2
+    video_times_are_utc: bool = True
+    staging_dir: Optional[Path] = None
+    manifest_path: Path = Path(
+        "~/.local/share/pupphoto/import_manifest.sqlite3"
+    ).expanduser()
 
     @classmethod
     def from_dict(cls, data: dict[str, Any], base_dir: Path) -> "ImportConfig":
@@ -51,6 +61,23 @@ class ImportConfig:
             supported_video_formats=[
                 suffix.lower() for suffix in kwargs["supported_video_formats"]
             ],
+            scan_workers=kwargs.get("scan_workers", 4),
+            metadata_workers=kwargs.get("metadata_workers", 8),
+            copy_workers=kwargs.get("copy_workers", 4),
+            device_io_limit=kwargs.get("device_io_limit", 2),
+            verify_workers=kwargs.get("verify_workers", 2),
+            video_times_are_utc=kwargs.get("video_times_are_utc", True),
+            staging_dir=(
+                _expand_path(kwargs["staging_dir"], base_dir)
+                if kwargs.get("staging_dir")
+                else None
+            ),
+            manifest_path=_expand_path(
+                kwargs.get(
+                    "manifest_path", "~/.local/share/pupphoto/import_manifest.sqlite3"
+                ),
+                base_dir,
+            ),
         )
 
 
@@ -61,6 +88,12 @@ class UploadConfig:
     rclone_destination: str
     public_base_url: str
     blog_image_dir: Path
+    upload_cache_path: Path = Path(
+        "~/.local/share/pupphoto/upload_cache.sqlite3"
+    ).expanduser()
+    rclone_rc_url: str = "http://localhost:5572"
+    rclone_rc_user: Optional[str] = None
+    rclone_rc_pass: Optional[str] = None
 
     @classmethod
     def from_dict(cls, data: dict[str, Any], base_dir: Path) -> "UploadConfig":
@@ -71,6 +104,15 @@ class UploadConfig:
             rclone_destination=kwargs["rclone_destination"],
             public_base_url=kwargs["public_base_url"].rstrip("/"),
             blog_image_dir=_expand_path(kwargs["blog_image_dir"], base_dir),
+            upload_cache_path=_expand_path(
+                kwargs.get(
+                    "upload_cache_path", "~/.local/share/pupphoto/upload_cache.sqlite3"
+                ),
+                base_dir,
+            ),
+            rclone_rc_url=kwargs.get("rclone_rc_url", "http://localhost:5572"),
+            rclone_rc_user=kwargs.get("rclone_rc_user"),
+            rclone_rc_pass=kwargs.get("rclone_rc_pass"),
         )
 
 
@@ -174,12 +216,19 @@ class AppConfig:
                 "camera_dir": str(self.import_config.camera_dir),
                 "photo_destination": str(self.import_config.photo_destination),
                 "video_destination": str(self.import_config.video_destination),
+                "manifest_path": str(self.import_config.manifest_path),
+                "staging_dir": (
+                    str(self.import_config.staging_dir)
+                    if self.import_config.staging_dir
+                    else None
+                ),
             },
             "upload": {
                 **raw["upload"],
                 "pictures_dir": str(self.upload.pictures_dir),
                 "thumb_dir": str(self.upload.thumb_dir),
                 "blog_image_dir": str(self.upload.blog_image_dir),
+                "upload_cache_path": str(self.upload.upload_cache_path),
             },
             "album": {
                 **raw["album"],
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from fractions import Fraction
+from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO
+import mmap
+import os
+import struct
+
+from mp4 import iter_boxes
+
+
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+
+# Byte size of one value of each TIFF field type
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+TYPE_FORMATS = {1: "B", 3: "H", 4: "I", 6: "b", 8: "h", 9: "i", 11: "f", 12: "d"}
+
+JPEG_SOI = b"\xff\xd8"
+EXIF_HEADER = b"Exif\x00\x00"
+RAF_MAGIC = b"FUJIFILMCCD-RAW"
+# Offset of the big-endian offset of the JPEG preview embedded in a RAF
+RAF_JPEG_OFFSET = 84
+CR3_BRAND = b"ftypcrx "
+# UUID of the box inside a CR3's moov that holds its CMT1..CMT4 TIFF blocks
+CR3_METADATA_UUID = bytes.fromhex("85c0b687820f11e08111f4ce462b6a48")
+
+
+class ExifError(ValueError):
+    pass
+
+
+@dataclass
+class IfdEntry:
+    tag: int
+    type: int
+    count: int
+    # Offset of the entry itself and of its value, relative to the TIFF header
+    entry_offset: int
+    value_offset: int
+
+    @property
+    def size(self) -> int:
+        return TYPE_SIZES.get(self.type, 1) * self.count
+
+
+# Byte-sliceable window onto an open file starting at base, so TIFF-based raws can be
+# parsed while reading only the IFDs and values that are actually looked at
+class FileView:
+    def __init__(self, f: BinaryIO, base: int = 0):
+        self.f = f
+        self.base = base
+        self.size = f.seek(0, os.SEEK_END) - base
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key: slice) -> bytes:
+        start = key.start or 0
+        stop = self.size if key.stop is None else min(key.stop, self.size)
+        self.f.seek(self.base + start)
+        return self.f.read(max(0, stop - start))
+
+
+# A TIFF structure (the payload of an EXIF block), in memory or in a FileView
+class Tiff:
+    def __init__(self, data: bytes | bytearray | memoryview):
+        self.data = data
+        byte_order = bytes(data[:2])
+        if byte_order == b"II":
+            self.endian = "<"
+        elif byte_order == b"MM":
+            self.endian = ">"
+        else:
+            raise ExifError("not a TIFF header")
+        # ORF and RW2 raws use their own magic number, so it is not checked
+        (self.ifd0_offset,) = self.unpack("I", 4)
+
+    def unpack(self, fmt: str, offset: int) -> tuple[Any, ...]:
+        fmt = self.endian + fmt
+        end = offset + struct.calcsize(fmt)
+        if offset < 0 or end > len(self.data):
+            raise ExifError(f"offset {offset} outside EXIF block")
+        return struct.unpack(fmt, self.data[offset:end])
+
+    def ifd(self, offset: int) -> dict[int, IfdEntry]:
+        (count,) = self.unpack("H", offset)
+        entries = {}
+        for i in range(count):
+            entry_offset = offset + 2 + 12 * i
+            tag, type_, value_count = self.unpack("HHI", entry_offset)
+            entry = IfdEntry(tag, type_, value_count, entry_offset, entry_offset + 8)
+            if entry.size > 4:
+                (entry.value_offset,) = self.unpack("I", entry_offset + 8)
+            entries[tag] = entry
+        return entries
+
+    def sub_ifd(self, ifd: dict[int, IfdEntry], tag: int) -> dict[int, IfdEntry]:
+        entry = ifd.get(tag)
+        if entry is None:
+            return {}
+        (offset,) = self.unpack("I", entry.value_offset)
+        return self.ifd(offset)
+
+    def value(self, entry: IfdEntry) -> Any:
+        start = entry.value_offset
+        end = start + entry.size
+        if end > len(self.data):
+            raise ExifError(f"tag {entry.tag:#06x} runs past EXIF block")
+        if entry.type == 2:
+            return bytes(self.data[start:end]).split(b"\x00", 1)[0].decode(
+                "ascii", "replace"
+            )
+        if entry.type in (5, 10):
+            fmt = "I" if entry.type == 5 else "i"
+            values = self.unpack(f"{2 * entry.count}{fmt}", start)
+            return tuple(
+                Fraction(num, den) if den else None
+                for num, den in zip(values[::2], values[1::2])
+            )
+        if entry.type in TYPE_FORMATS:
+            return self.unpack(f"{entry.count}{TYPE_FORMATS[entry.type]}", start)
+        return bytes(self.data[start:end])
+
+    def exif_ifd(self) -> dict[int, IfdEntry]:
+        return self.sub_ifd(self.ifd(self.ifd0_offset), TAG_EXIF_IFD)
+
+
+# Locate the EXIF APP1 segment of a JPEG without reading past the header segments.
+# Returns the file offset of the TIFF header and the TIFF bytes.
+def find_jpeg_exif(f: BinaryIO) -> tuple[int, bytes] | None:
+    start = f.tell()
+    if f.read(2) != JPEG_SOI:
+        return None
+    while True:
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        kind = marker[1]
+        # Start of scan or end of image: the metadata segments are over
+        if kind in (0xDA, 0xD9):
+            return None
+        (length,) = struct.unpack(">H", marker[2:])
+        if kind == 0xE1:
+            payload = f.read(length - 2)
+            if payload.startswith(EXIF_HEADER):
+                offset = f.tell() - len(payload) + len(EXIF_HEADER) - start
+                return offset, payload[len(EXIF_HEADER) :]
+        else:
+            f.seek(length - 2, 1)
+
+
+# Read the EXIF block of a JPEG file
+def read_exif(path: Path | str) -> Tiff | None:
+    with open(path, "rb") as f:
+        found = find_jpeg_exif(f)
+    return Tiff(found[1]) if found else None
+
+
+# Read one of the CMT1..CMT4 TIFF blocks of a Canon CR3 from its moov box.
+# Returns the file offset of the block and its bytes.
+def _read_cr3_block(f: BinaryIO, name: bytes) -> tuple[int, bytes] | None:
+    file_size = f.seek(0, os.SEEK_END)
+    for kind, start, end in iter_boxes(f, 0, file_size):
+        if kind != b"moov":
+            continue
+        for kind, start, end in iter_boxes(f, start, end):
+            f.seek(start)
+            if kind != b"uuid" or f.read(16) != CR3_METADATA_UUID:
+                continue
+            for kind, start, end in iter_boxes(f, start + 16, end):
+                if kind == name:
+                    f.seek(start)
+                    return start, f.read(end - start)
+        return None
+    return None
+
+
+# Open the TIFF structure holding the metadata of a JPEG, a Fujifilm RAF or a
+# TIFF-based raw (DNG, ARW, NEF, CR2, ...), or the given CMT block of a Canon CR3,
+# reading only the header structures. Also returns the file offset of the TIFF
+# header and whether it is a CR3 block, whose first IFD is the sub-IFD itself
+# rather than IFD0.
+def _open_tiff(f: BinaryIO, cr3_block: bytes) -> tuple[Tiff, int, bool] | None:
+    head = f.read(16)
+    f.seek(0)
+    jpeg_offset = 0
+    if head.startswith(RAF_MAGIC):
+        f.seek(RAF_JPEG_OFFSET)
+        (jpeg_offset,) = struct.unpack(">I", f.read(4))
+        f.seek(jpeg_offset)
+        head = JPEG_SOI
+    if head.startswith(JPEG_SOI):
+        found = find_jpeg_exif(f)
+        if found is None:
+            return None
+        return Tiff(found[1]), jpeg_offset + found[0], False
+    if head[4:12] == CR3_BRAND:
+        block = _read_cr3_block(f, cr3_block)
+        return (Tiff(block[1]), block[0], True) if block else None
+    if head[:2] in (b"II", b"MM"):
+        return Tiff(FileView(f)), 0, False
+    return None
+
+
+# Find the IFD holding the Exif tags of a JPEG or raw file.
+# The file must stay open while the returned Tiff is used.
+def open_exif_ifd(f: BinaryIO) -> tuple[Tiff, dict[int, IfdEntry]] | None:
+    found = _open_tiff(f, b"CMT2")
+    if found is None:
+        return None
+    tiff, _, is_cr3 = found
+    if is_cr3:
+        return tiff, tiff.ifd(tiff.ifd0_offset)
+    return tiff, tiff.exif_ifd()
+
+
+# Find the GPS IFD of a JPEG or raw file, or an empty dict if it has none.
+# The file must stay open while the returned Tiff is used.
+def open_gps_ifd(f: BinaryIO) -> tuple[Tiff, dict[int, IfdEntry]] | None:
+    found = _open_tiff(f, b"CMT4")
+    if found is None:
+        return None
+    tiff, _, is_cr3 = found
+    if is_cr3:
+        return tiff, tiff.ifd(tiff.ifd0_offset)
+    return tiff, tiff.sub_ifd(tiff.ifd(tiff.ifd0_offset), TAG_GPS_IFD)
+
+
+# Byte patches, relative to the TIFF header, that remove the GPS data: the GPS IFD
+# and the values it points to are zeroed and left as an empty IFD, and the GPS
+# pointer is dropped from IFD0 by shifting the later entries (and the next-IFD
+# offset) up by one entry. Nothing moves, so the patches never change the size
+# of the EXIF block.
+def _gps_removal_patches(tiff: Tiff, is_cr3: bool) -> list[tuple[int, bytes]]:
+    patches = []
+    if is_cr3:
+        gps_offset = tiff.ifd0_offset
+    else:
+        ifd0 = tiff.ifd(tiff.ifd0_offset)
+        pointer = ifd0.get(TAG_GPS_IFD)
+        if pointer is None:
+            return []
+        (gps_offset,) = tiff.unpack("I", pointer.value_offset)
+        (count,) = tiff.unpack("H", tiff.ifd0_offset)
+        tail_start = pointer.entry_offset + 12
+        tail_end = tiff.ifd0_offset + 2 + 12 * count + 4
+        tail = bytes(tiff.data[tail_start:tail_end])
+        patches.append((tiff.ifd0_offset, struct.pack(tiff.endian + "H", count - 1)))
+        patches.append((pointer.entry_offset, tail + bytes(12)))
+    gps_ifd = tiff.ifd(gps_offset)
+    if is_cr3 and not gps_ifd:
+        return []
+    for entry in gps_ifd.values():
+        if entry.size > 4 and entry.value_offset + entry.size <= len(tiff.data):
+            patches.append((entry.value_offset, bytes(entry.size)))
+    gps_end = min(gps_offset + 2 + 12 * len(gps_ifd) + 4, len(tiff.data))
+    patches.append((gps_offset, bytes(gps_end - gps_offset)))
+    return patches
+
+
+# The same patches, relative to the start of a whole JPEG or raw file
+def _gps_file_patches(f: BinaryIO) -> list[tuple[int, bytes]]:
+    found = _open_tiff(f, b"CMT4")
+    if found is None:
+        raise ExifError("no EXIF block found")
+    tiff, base, is_cr3 = found
+    try:
+        patches = _gps_removal_patches(tiff, is_cr3)
+    except struct.error as e:
+        raise ExifError(str(e)) from e
+    return [(base + offset, data) for offset, data in patches]
+
+
+# Remove the GPS data from a JPEG or raw file in place: the few changed bytes of
+# the EXIF block are patched through an mmap, so the file is neither rewritten nor
+# resized and every byte outside the EXIF block stays the same. Returns False if
+# there is no GPS data. Raises ExifError if the file has no EXIF block it can parse.
+def remove_gps_ifd(path: Path | str) -> bool:
+    with open(path, "r+b") as f:
+        try:
+            patches = _gps_file_patches(f)
+        except ExifError as e:
+            raise ExifError(f"{path}: {e}") from e
+        if not patches:
+            return False
+        with mmap.mmap(f.fileno(), 0) as mapped:
+            for offset, data in patches:
+                mapped[offset : offset + len(data)] = data
+            mapped.flush()
+    return True
+
+
+# remove_gps_ifd for an image held in memory, e.g. a freshly encoded thumbnail
+def remove_gps_from_buffer(buffer: bytearray | memoryview) -> bool:
+    patches = _gps_file_patches(BytesIO(buffer))
+    for offset, data in patches:
+        buffer[offset : offset + len(data)] = data
+    return bool(patches)
+
+
+# Return DateTimeOriginal as stored, e.g. "2023:10:01 11:36:11", or None.
+# Works on JPEGs and on raw files without reading their image data.
+def datetime_original(path: Path | str) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            found = open_exif_ifd(f)
+            if found is None:
+                return None
+            tiff, exif_ifd = found
+            entry = exif_ifd.get(TAG_DATETIME_ORIGINAL)
+            if entry is None or entry.type != 2:
+                return None
+            return tiff.value(entry).strip() or None
+    except (OSError, ExifError, struct.error):
+        return None
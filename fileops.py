@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Optional
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+# ioctl that makes dst share src's extents on btrfs/XFS (Linux FICLONE)
+FICLONE = 0x40049409
+# Chunk size for copy_file_range/sendfile, and the buffer for plain copies
+CHUNK_SIZE = 64 * 1024 * 1024
+BUFFER_SIZE = 4 * 1024 * 1024
+
+# Extended attribute holding "<sha1> <size> <mtime_ns>" of the file it is set on
+SHA1_XATTR = "user.pupphoto.sha1"
+
+# Errors meaning "this strategy is not available here", not "the copy failed"
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.ETXTBSY,
+}
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            return False
+        raise
+    return True
+
+
+# Copy with a kernel-side primitive until EOF. Returns False without having
+# written anything if the primitive is not supported for this pair of files.
+def _copy_in_kernel(src_fd: int, dst_fd: int, use_copy_file_range: bool) -> bool:
+    offset = 0
+    while True:
+        try:
+            if use_copy_file_range:
+                copied = os.copy_file_range(src_fd, dst_fd, CHUNK_SIZE)
+            else:
+                copied = os.sendfile(dst_fd, src_fd, offset, CHUNK_SIZE)
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if copied == 0:
+            return True
+        offset += copied
+
+
+def _copy_buffered(src_fd: int, dst_fd: int) -> None:
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(src_fd, "rb", buffering=0, closefd=False) as fsrc:
+        while n := fsrc.readinto(buffer):
+            written = 0
+            while written < n:
+                written += os.write(dst_fd, view[written:n])
+
+
+# Copy file contents with the cheapest strategy available: a reflink on the same
+# btrfs/XFS filesystem, copy_file_range or sendfile in large chunks across
+# filesystems, and a plain buffered copy otherwise. Returns the strategy used.
+def copy_contents(src_fd: int, dst_fd: int) -> str:
+    if _reflink(src_fd, dst_fd):
+        return "reflink"
+    if hasattr(os, "copy_file_range") and _copy_in_kernel(src_fd, dst_fd, True):
+        return "copy_file_range"
+    if hasattr(os, "sendfile") and _copy_in_kernel(src_fd, dst_fd, False):
+        return "sendfile"
+    _copy_buffered(src_fd, dst_fd)
+    return "buffered"
+
+
+# Drop-in replacement for shutil.copy2 (or shutil.copyfile when
+# preserve_metadata is False) built on copy_contents
+def copy_file(src: Path | str, dst: Path | str, *, preserve_metadata: bool = True):
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "wb", buffering=0) as fdst:
+        copy_contents(fsrc.fileno(), fdst.fileno())
+    if preserve_metadata:
+        shutil.copystat(src, dst)
+    return dst
+
+
+# Remember a file's digest in an xattr, together with the size and mtime it had.
+# Filesystems without user xattrs are silently ignored.
+def store_sha1(path: Path | str, sha1: str) -> None:
+    if not hasattr(os, "setxattr"):
+        return
+    try:
+        st = os.stat(path)
+        value = f"{sha1} {st.st_size} {st.st_mtime_ns}".encode()
+        os.setxattr(path, SHA1_XATTR, value)
+    except OSError:
+        pass
+
+
+# Return the digest stored by store_sha1, as long as the file still has the same
+# size and mtime it had when the digest was stored
+def cached_sha1(path: Path | str) -> Optional[str]:
+    if not hasattr(os, "getxattr"):
+        return None
+    try:
+        value = os.getxattr(path, SHA1_XATTR).decode()
+        st = os.stat(path)
+    except OSError:
+        return None
+    try:
+        sha1, size, mtime_ns = value.split()
+        if int(size) == st.st_size and int(mtime_ns) == st.st_mtime_ns:
+            return sha1
+    except ValueError:
+        pass
+    return None
+
+
+# Compute SHA1 hash of a file, trusting and refreshing the cached digest
+def sha1sum(path: Path | str) -> str:
+    sha1 = cached_sha1(path)
+    if sha1 is None:
+        with open(path, "rb", buffering=0) as f:
+            sha1 = hashlib.file_digest(f, "sha1").hexdigest()
+        store_sha1(path, sha1)
+    return sha1
+
+
+# Copy a file into destination while hashing it, so the source is read only once.
+# The data lands in a hidden temporary file that is renamed to name(sha1) at the end.
+# On a filesystem with reflinks the copy is a clone and only the hash reads data.
+# The digest is cached on the copy with store_sha1.
+def copy_and_hash(
+    src: Path, destination: Path, name: Callable[[str], str]
+) -> tuple[Path, str]:
+    fd, tmp_name = tempfile.mkstemp(dir=destination, prefix=".", suffix=".part")
+    tmp_path = Path(tmp_name)
+    try:
+        with open(src, "rb", buffering=0) as fsrc, open(fd, "wb", buffering=0) as fdst:
+            if _reflink(fsrc.fileno(), fdst.fileno()):
+                digest = hashlib.file_digest(fsrc, "sha1")
+            else:
+                digest = hashlib.sha1()
+                buffer = bytearray(BUFFER_SIZE)
+                view = memoryview(buffer)
+                while n := fsrc.readinto(buffer):
+                    digest.update(view[:n])
+                    fdst.write(view[:n])
+        shutil.copystat(src, tmp_path)
+        sha1 = digest.hexdigest()
+        store_sha1(tmp_path, sha1)
+        dst = destination / name(sha1)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return dst, sha1
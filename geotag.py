@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import datetime
+import os
+import subprocess
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+from tqdm import tqdm
+
+import exif
+import gps
+
+
+# Photos further than this from the nearest track point are left untagged, and
+# track points further apart than this are not interpolated between
+DEFAULT_MAX_GAP_SECONDS = 300.0
+
+
+@dataclass
+class Track:
+    # Seconds since the Unix epoch, sorted, and the matching positions in degrees
+    times: np.ndarray
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+
+
+# Convert GPX timestamps to seconds since the Unix epoch. Almost every logger
+# writes UTC with a trailing Z, which NumPy parses in a single call.
+def _parse_times(values: list[str]) -> np.ndarray:
+    if all(value.endswith("Z") for value in values):
+        parsed = np.array([value[:-1] for value in values], dtype="datetime64[ms]")
+        return parsed.astype(np.int64) / 1000
+    times = []
+    for value in values:
+        taken = datetime.datetime.fromisoformat(value)
+        if taken.tzinfo is None:
+            taken = taken.replace(tzinfo=datetime.timezone.utc)
+        times.append(taken.timestamp())
+    return np.asarray(times, dtype=float)
+
+
+# Load the track points of one or more GPX files into one track sorted by time.
+# The files are streamed with iterparse and each segment is cleared as it is
+# read, so million-point logs never sit in memory as an element tree.
+def load_tracks(paths: list[Path]) -> Track:
+    times: list[str] = []
+    latitudes: list[str] = []
+    longitudes: list[str] = []
+    for path in paths:
+        segment = None
+        time = None
+        for event, element in ElementTree.iterparse(path, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                if tag.endswith("trkseg"):
+                    segment = element
+                elif tag.endswith("trkpt"):
+                    time = None
+            elif tag.endswith("}time") or tag == "time":
+                time = element.text
+            elif tag.endswith("trkpt"):
+                if time and time.strip():
+                    times.append(time.strip())
+                    latitudes.append(element.get("lat"))
+                    longitudes.append(element.get("lon"))
+                if segment is not None:
+                    segment.clear()
+    parsed_times = _parse_times(times)
+    order = np.argsort(parsed_times, kind="stable")
+    return Track(
+        parsed_times[order],
+        np.asarray(latitudes, dtype=float)[order],
+        np.asarray(longitudes, dtype=float)[order],
+    )
+
+
+# Position of the track at each of the given times, by binary search and linear
+# interpolation between the surrounding points. Returns latitudes, longitudes, and
+# a mask of the times that could be matched.
+def match_times(
+    track: Track, times: np.ndarray, max_gap: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    count = len(track.times)
+    if count == 0:
+        nothing = np.full(len(times), np.nan)
+        return nothing, nothing, np.zeros(len(times), dtype=bool)
+    right = np.clip(np.searchsorted(track.times, times), 1, count - 1)
+    left = right - 1
+    if count == 1:
+        left = right = np.zeros(len(times), dtype=int)
+    left_gap = np.abs(times - track.times[left])
+    right_gap = np.abs(track.times[right] - times)
+    nearest = np.where(left_gap <= right_gap, left, right)
+    matched = np.minimum(left_gap, right_gap) <= max_gap
+
+    span = track.times[right] - track.times[left]
+    between = (span > 0) & (span <= max_gap) & (left_gap + right_gap <= span)
+    fraction = np.divide(left_gap, span, out=np.zeros(len(times)), where=between)
+    latitudes = np.where(
+        between,
+        track.latitudes[left]
+        + fraction * (track.latitudes[right] - track.latitudes[left]),
+        track.latitudes[nearest],
+    )
+    longitudes = np.where(
+        between,
+        track.longitudes[left]
+        + fraction * (track.longitudes[right] - track.longitudes[left]),
+        track.longitudes[nearest],
+    )
+    return latitudes, longitudes, matched
+
+
+# DateTimeOriginal of a photo as a Unix timestamp. The camera clock is assumed to be
+# in utc_offset, or in this machine's time zone if that is None.
+def photo_timestamp(
+    path: Path, utc_offset: Optional[datetime.timezone]
+) -> Optional[float]:
+    value = exif.datetime_original(path)
+    if value is None:
+        return None
+    try:
+        taken = datetime.datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    if utc_offset is None:
+        return taken.astimezone().timestamp()
+    return taken.replace(tzinfo=utc_offset).timestamp()
+
+
+def _exiv2_rational(degrees: float) -> str:
+    minutes, hundredths = divmod(round(abs(degrees) * 360000), 6000)
+    return f"{minutes // 60}/1 {minutes % 60}/1 {hundredths}/100"
+
+
+# Write the position into the photo's GPS tags with a single exiv2 call. Returns
+# why that failed, if it did.
+def write_position(path: Path, lat: float, lon: float) -> Optional[str]:
+    commands = [
+        "set Exif.GPSInfo.GPSVersionID 2 3 0 0",
+        f"set Exif.GPSInfo.GPSLatitudeRef {'N' if lat >= 0 else 'S'}",
+        f"set Exif.GPSInfo.GPSLatitude {_exiv2_rational(lat)}",
+        f"set Exif.GPSInfo.GPSLongitudeRef {'E' if lon >= 0 else 'W'}",
+        f"set Exif.GPSInfo.GPSLongitude {_exiv2_rational(lon)}",
+        "set Exif.GPSInfo.GPSMapDatum WGS-84",
+    ]
+    arguments = ["exiv2"]
+    for command in commands:
+        arguments += ["-M", command]
+    try:
+        result = subprocess.run(
+            arguments + [str(path)], capture_output=True, text=True
+        )
+    except OSError as e:
+        return f"{path}: {e}"
+    if result.returncode != 0:
+        error = result.stderr.strip() or f"exiv2 exited with {result.returncode}"
+        return f"{path}: {error}"
+    return None
+
+
+# Write every match in parallel. A photo that cannot be written does not stop the
+# others; the failures are returned.
+def write_positions(to_write: list[tuple[Path, float, float]]) -> list[str]:
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(
+            tqdm(
+                executor.map(lambda match: write_position(*match), to_write),
+                total=len(to_write),
+                desc="Geotagging",
+            )
+        )
+    return [failure for failure in results if failure is not None]
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Geotag photos from GPX track logs by their capture time."
+    )
+    parser.add_argument("photos", nargs="+", type=Path)
+    parser.add_argument(
+        "--gpx",
+        type=Path,
+        action="append",
+        required=True,
+        help="GPX track log; may be given several times.",
+    )
+    parser.add_argument(
+        "--utc-offset",
+        type=float,
+        help="Hours the camera clock is ahead of UTC (defaults to local time).",
+    )
+    parser.add_argument(
+        "--max-gap",
+        type=float,
+        default=DEFAULT_MAX_GAP_SECONDS,
+        help="Seconds from the nearest track point beyond which a photo is skipped.",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Also tag photos that already have GPS data.",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Print the matches without writing."
+    )
+    args = parser.parse_args()
+
+    track = load_tracks(args.gpx)
+    print(f"Loaded {len(track.times)} track points")
+    utc_offset = (
+        None
+        if args.utc_offset is None
+        else datetime.timezone(datetime.timedelta(hours=args.utc_offset))
+    )
+
+    photos = []
+    timestamps = []
+    skipped_tagged = []
+    no_date = []
+    for path in args.photos:
+        if not args.overwrite and gps.lat_lon_from_metadata(path) is not None:
+            skipped_tagged.append(path)
+            continue
+        timestamp = photo_timestamp(path, utc_offset)
+        if timestamp is None:
+            no_date.append(path)
+            continue
+        photos.append(path)
+        timestamps.append(timestamp)
+
+    latitudes, longitudes, matched = match_times(
+        track, np.asarray(timestamps, dtype=float), args.max_gap
+    )
+    banned = gps.get_banned_area_index().contains(latitudes, longitudes) & matched
+    to_write = [
+        (path, float(lat), float(lon))
+        for path, lat, lon, ok, hidden in zip(
+            photos, latitudes, longitudes, matched, banned
+        )
+        if ok and not hidden
+    ]
+
+    if args.dry_run:
+        for path, lat, lon in to_write:
+            print(f"{path}: {lat:.6f}, {lon:.6f}")
+        print(f"Would geotag photos: {len(to_write)}")
+    else:
+        failures = write_positions(to_write)
+        print(f"Geotagged photos: {len(to_write) - len(failures)}")
+        if failures:
+            print(f"Could not write: {len(failures)}")
+            for failure in failures:
+                print(f"   {failure}")
+    print(f"Already had GPS data: {len(skipped_tagged)}")
+    print(f"No capture time: {len(no_date)}")
+    print(f"Outside the track: {int(np.count_nonzero(~matched))}")
+    print(f"Inside a banned area, left untagged: {int(np.count_nonzero(banned))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,258 @@
-from math import atan2, cos, radians, sin, sqrt
+from fractions import Fraction
 from pathlib import Path
-from typing import Optional, Tuple
+from io import BytesIO
+from typing import BinaryIO, Optional, Sequence, Tuple
 
+import hashlib
+import shutil
+import struct
 import subprocess
-import re
+import tempfile
 
-from config import load_config
+import numpy as np
+from numpy.typing import ArrayLike
 
+from config import BannedArea, load_config
+import exif
 
-banned_areas = load_config().banned_areas
+
+TAG_GPS_LATITUDE_REF = 1
+TAG_GPS_LATITUDE = 2
+TAG_GPS_LONGITUDE_REF = 3
+TAG_GPS_LONGITUDE = 4
+
+# The same tags as exiv2 keys, for files exif.py cannot parse
+EXIV2_GPS_KEYS = {
+    "Exif.GPSInfo.GPSLatitudeRef": TAG_GPS_LATITUDE_REF,
+    "Exif.GPSInfo.GPSLatitude": TAG_GPS_LATITUDE,
+    "Exif.GPSInfo.GPSLongitudeRef": TAG_GPS_LONGITUDE_REF,
+    "Exif.GPSInfo.GPSLongitude": TAG_GPS_LONGITUDE,
+}
+
+
+EARTH_RADIUS_METERS = 6371000
+# Points are checked against the areas in chunks of this many, to bound the size
+# of the points x areas distance matrix
+BANNED_AREA_CHUNK_SIZE = 4096
+
+
+# Banned areas precomputed as NumPy arrays of radians, with cos(latitude) cached,
+# so a single point or a whole array of points is checked against every area in
+# one vectorized haversine. Rather than taking the arcsine, the haversine term is
+# compared with its value at each area's radius.
+class BannedAreaIndex:
+    def __init__(self, areas: Sequence[BannedArea]):
+        self.areas = list(areas)
+        self.latitudes = np.radians([area.latitude for area in areas])
+        self.longitudes = np.radians([area.longitude for area in areas])
+        self.cos_latitudes = np.cos(self.latitudes)
+        angular_radii = np.minimum(
+            np.array([area.radius_meters for area in areas], dtype=float)
+            / EARTH_RADIUS_METERS,
+            np.pi,
+        )
+        self.max_haversines = np.sin(angular_radii / 2) ** 2
+        # Changes whenever an area is added, removed or moved, so caches of scrubbed
+        # output can tell that it was scrubbed against other areas
+        self.digest = hashlib.sha1(
+            repr(
+                sorted(
+                    (area.latitude, area.longitude, area.radius_meters)
+                    for area in self.areas
+                )
+            ).encode()
+        ).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    # Returns a bool for a single point, or a bool array for arrays of points
+    def contains(self, lat: ArrayLike, lon: ArrayLike) -> bool | np.ndarray:
+        lat = np.radians(np.asarray(lat, dtype=float))
+        lon = np.radians(np.asarray(lon, dtype=float))
+        scalar = lat.ndim == 0
+        lat, lon = np.broadcast_arrays(np.atleast_1d(lat), np.atleast_1d(lon))
+        result = np.zeros(lat.shape, dtype=bool)
+        if len(self):
+            flat_lat, flat_lon = lat.ravel(), lon.ravel()
+            flat_result = result.reshape(-1)
+            for start in range(0, flat_lat.size, BANNED_AREA_CHUNK_SIZE):
+                chunk = slice(start, start + BANNED_AREA_CHUNK_SIZE)
+                chunk_lat = flat_lat[chunk, None]
+                chunk_lon = flat_lon[chunk, None]
+                haversines = (
+                    np.sin((chunk_lat - self.latitudes) / 2) ** 2
+                    + np.cos(chunk_lat)
+                    * self.cos_latitudes
+                    * np.sin((chunk_lon - self.longitudes) / 2) ** 2
+                )
+                flat_result[chunk] = (haversines <= self.max_haversines).any(axis=1)
+        return bool(result[0]) if scalar else result
+
+
+_banned_area_index: Optional[BannedAreaIndex] = None
+
+
+# Index of the banned areas in config.toml, loaded on first use so that importing
+# this module neither needs nor parses the config file
+def get_banned_area_index() -> BannedAreaIndex:
+    global _banned_area_index
+    if _banned_area_index is None:
+        _banned_area_index = BannedAreaIndex(load_config().banned_areas)
+    return _banned_area_index
+
+
+# Use these banned areas instead of the ones in config.toml, e.g. in tests and
+# benchmarks
+def set_banned_areas(areas: Sequence[BannedArea]) -> None:
+    global _banned_area_index
+    _banned_area_index = BannedAreaIndex(areas)
 
 
 # Function to check if a coordinate is within a banned area
 def is_in_banned_area(lat: float, lon: float) -> bool:
-    def haversine(lat1, lon1, lat2, lon2):
-        earth_radius = 6371000
-        dlat = radians(lat2 - lat1)
-        dlon = radians(lon2 - lon1)
-        a = (
-            sin(dlat / 2) ** 2
-            + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-        )
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return earth_radius * c
+    return bool(get_banned_area_index().contains(lat, lon))
 
-    for area in banned_areas:
-        distance = haversine(lat, lon, area.latitude, area.longitude)
-        if distance <= area.radius_meters:
-            return True
-    return False
 
+def _degrees(
+    value: Optional[Tuple[Optional[Fraction], ...]], ref: Optional[str], positive: str
+) -> Optional[Fraction]:
+    if not value or not ref or len(value) < 3 or None in value[:3]:
+        return None
+    degrees, minutes, seconds = value[:3]
+    result = degrees + minutes / 60 + seconds / 3600
+    return result if ref.strip().upper() == positive else -result
 
-def lat_lon_from_metadata(image_path: Path | str) -> Optional[Tuple[float, float]]:
-    """
-    Extract latitude and longitude from image metadata using exiv2 CLI.
-    Returns (lat, lon) in decimal degrees or None if not available.
-    """
-    path = str(image_path)
-    try:
-        raw_lat = subprocess.check_output(
-            ["exiv2", "-g", "Exif.GPSInfo.GPSLatitude", "-Pv", path], text=True
-        ).strip()
-        raw_lon = subprocess.check_output(
-            ["exiv2", "-g", "Exif.GPSInfo.GPSLongitude", "-Pv", path], text=True
-        ).strip()
-        lat_ref = subprocess.check_output(
-            ["exiv2", "-g", "Exif.GPSInfo.GPSLatitudeRef", "-Pv", path], text=True
-        ).strip()
-        lon_ref = subprocess.check_output(
-            ["exiv2", "-g", "Exif.GPSInfo.GPSLongitudeRef", "-Pv", path], text=True
-        ).strip()
-    except subprocess.CalledProcessError:
+
+def _lat_lon_from_values(values: dict) -> Optional[Tuple[Fraction, Fraction]]:
+    lat = _degrees(
+        values.get(TAG_GPS_LATITUDE), values.get(TAG_GPS_LATITUDE_REF), "N"
+    )
+    lon = _degrees(
+        values.get(TAG_GPS_LONGITUDE), values.get(TAG_GPS_LONGITUDE_REF), "E"
+    )
+    if lat is None or lon is None:
         return None
+    return (lat, lon)
+
 
-    if not raw_lat or not raw_lon or not lat_ref or not lon_ref:
+# Read the position from the GPS IFD of a JPEG or raw file. Raises ExifError if the
+# file has no EXIF block exif.py can find, as opposed to returning None for one
+# without GPS data. A JPEG keeps its Exif tags only in the APP1 segment exif.py
+# looks for, so a JPEG without one has no GPS data.
+def _read_exact_lat_lon(f: BinaryIO) -> Optional[Tuple[Fraction, Fraction]]:
+    found = exif.open_gps_ifd(f)
+    if found is None:
+        f.seek(0)
+        if f.read(2) == exif.JPEG_SOI:
+            return None
+        raise exif.ExifError("no EXIF block found")
+    tiff, gps_ifd = found
+    return _lat_lon_from_values(
+        {
+            tag: tiff.value(gps_ifd[tag])
+            for tag in EXIV2_GPS_KEYS.values()
+            if tag in gps_ifd
+        }
+    )
+
+
+def _exiv2_rationals(
+    value: Optional[str],
+) -> Optional[Tuple[Optional[Fraction], ...]]:
+    if not value:
         return None
+    rationals = []
+    for part in value.split():
+        try:
+            rationals.append(Fraction(part))
+        except (ValueError, ZeroDivisionError):
+            rationals.append(None)
+    return tuple(rationals)
 
-    nums_lat = re.findall(r"[-+]?\d*\.\d+|\d+", raw_lat)
-    nums_lon = re.findall(r"[-+]?\d*\.\d+|\d+", raw_lon)
-    if len(nums_lat) < 3 or len(nums_lon) < 3:
+
+# Read the position with a single exiv2 call, for the files exif.py cannot parse
+# (PNG, WebP, HEIF, ...)
+def _exiv2_exact_lat_lon(
+    image_path: Path | str,
+) -> Optional[Tuple[Fraction, Fraction]]:
+    command = ["exiv2", "-Pkv"]
+    for key in EXIV2_GPS_KEYS:
+        command += ["-g", key]
+    try:
+        output = subprocess.run(
+            command + [str(image_path)],
+            capture_output=True,
+            text=True,
+        ).stdout
+    except OSError:
         return None
+    values = {}
+    for line in output.splitlines():
+        parts = line.split(None, 1)
+        if len(parts) == 2 and parts[0] in EXIV2_GPS_KEYS:
+            values[EXIV2_GPS_KEYS[parts[0]]] = parts[1].strip()
+    for tag in (TAG_GPS_LATITUDE, TAG_GPS_LONGITUDE):
+        values[tag] = _exiv2_rationals(values.get(tag))
+    return _lat_lon_from_values(values)
+
+
+def exact_lat_lon_from_metadata(
+    image_path: Path | str,
+) -> Optional[Tuple[Fraction, Fraction]]:
+    """
+    Read latitude and longitude from the GPS IFD of a JPEG or raw file, in-process
+    and from the header only, or with exiv2 for other formats. Returns (lat, lon)
+    as exact rationals in decimal degrees, or None if not available.
+    """
     try:
-        d_lat, m_lat, s_lat = map(float, nums_lat[:3])
-        d_lon, m_lon, s_lon = map(float, nums_lon[:3])
-    except ValueError:
+        with open(image_path, "rb") as f:
+            return _read_exact_lat_lon(f)
+    except OSError:
         return None
+    except (exif.ExifError, struct.error):
+        pass
+    return _exiv2_exact_lat_lon(image_path)
 
-    lat = d_lat + m_lat / 60 + s_lat / 3600
-    lon = d_lon + m_lon / 60 + s_lon / 3600
 
-    if lat_ref.upper() != "N":
-        lat = -lat
-    if lon_ref.upper() != "E":
-        lon = -lon
+def lat_lon_from_metadata(image_path: Path | str) -> Optional[Tuple[float, float]]:
+    """
+    Extract latitude and longitude from image metadata.
+    Returns (lat, lon) in decimal degrees or None if not available.
+    """
+    coords = exact_lat_lon_from_metadata(image_path)
+    if coords is None:
+        return None
+    return (float(coords[0]), float(coords[1]))
 
-    return (lat, lon)
+
+# Remove every GPS tag from an image. The EXIF block is patched in place; files
+# exif.py cannot edit fall back to a single exiv2 call that deletes every GPS tag
+# in one rewrite. Returns True if metadata was modified.
+def scrub_gps(image_path: Path | str) -> bool:
+    path = str(image_path)
+    try:
+        return exif.remove_gps_ifd(path)
+    except exif.ExifError:
+        pass
+    try:
+        output = subprocess.check_output(
+            ["exiv2", "-g", "Exif.GPSInfo", "-pa", path], text=True
+        )
+    except subprocess.CalledProcessError:
+        return False
+
+    command = ["exiv2"]
+    for line in output.splitlines():
+        parts = line.split()
+        if parts and parts[0].startswith("Exif.GPSInfo"):
+            command += ["-M", f"del {parts[0]}"]
+    if len(command) == 1:
+        return False
+    subprocess.run(
+        command + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return True
 
 
 # Function to remove GPS data if within banned area
@@ -83,34 +261,44 @@ def remove_gps_if_banned(image_path: Path | str) -> bool:
     Remove GPS metadata tags if image taken within a banned area.
     Returns True if metadata was modified.
     """
-    path = str(image_path)
-    coords = lat_lon_from_metadata(path)
+    coords = lat_lon_from_metadata(image_path)
     if coords is None:
         return False
     lat, lon = coords
 
-    if is_in_banned_area(lat, lon):
-        try:
-            output = subprocess.check_output(
-                ["exiv2", "-g", "Exif.GPSInfo", "-pa", path], text=True
-            )
-        except subprocess.CalledProcessError:
-            return False
-
-        tags_to_delete = []
-        for line in output.splitlines():
-            parts = line.split()
-            if parts:
-                tag = parts[0]
-                if tag.startswith("Exif.GPSInfo"):
-                    tags_to_delete.append(tag)
-
-        for tag in tags_to_delete:
-            subprocess.run(
-                ["exiv2", "-M", f"del {tag}", path],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-        return True
-
-    return False
+    if not is_in_banned_area(lat, lon):
+        return False
+    return scrub_gps(image_path)
+
+
+# remove_gps_if_banned for an image held in memory. The buffer is patched in place
+# if exif.py can parse it; otherwise it is written to a temporary file with the
+# given suffix and checked and scrubbed with exiv2 there. Returns the bytes to use
+# and whether GPS data was removed. Raises ExifError rather than return an image
+# whose GPS data could not be checked or removed.
+def remove_gps_from_buffer_if_banned(
+    buffer: bytearray | memoryview, suffix: str
+) -> tuple[bytes | bytearray | memoryview, bool]:
+    try:
+        coords = _read_exact_lat_lon(BytesIO(buffer))
+    except (exif.ExifError, struct.error):
+        return _remove_gps_with_exiv2_if_banned(buffer, suffix)
+    if coords is None or not is_in_banned_area(float(coords[0]), float(coords[1])):
+        return buffer, False
+    return buffer, exif.remove_gps_from_buffer(buffer)
+
+
+def _remove_gps_with_exiv2_if_banned(
+    buffer: bytearray | memoryview, suffix: str
+) -> tuple[bytes | bytearray | memoryview, bool]:
+    if shutil.which("exiv2") is None:
+        raise exif.ExifError("cannot read the GPS data of this image without exiv2")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"image{suffix}"
+        path.write_bytes(buffer)
+        if not remove_gps_if_banned(path):
+            return buffer, False
+        coords = lat_lon_from_metadata(path)
+        if coords is not None and is_in_banned_area(*coords):
+            raise exif.ExifError("exiv2 could not remove the GPS data")
+        return path.read_bytes(), True
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+import os
+import sqlite3
+
+from tqdm import tqdm
+
+import gps
+
+
+JPEG_SUFFIXES = {".jpg", ".jpeg"}
+DEFAULT_STATE_PATH = Path("~/.local/share/pupphoto/gps_audit.sqlite3").expanduser()
+# Files handed to a worker process at a time
+CHUNK_SIZE = 64
+# Audit results written to the state file per transaction
+COMMIT_INTERVAL = 1024
+
+
+# Audit results kept between runs, keyed by absolute path, size and mtime, so an
+# interrupted audit resumes where it stopped and files that changed since are read
+# again. Coordinates are stored rather than verdicts, so editing banned_areas does
+# not require re-reading any file.
+class AuditState:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS audited (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                latitude REAL,
+                longitude REAL
+            )
+            """
+        )
+        self._uncommitted = 0
+
+    def __enter__(self) -> "AuditState":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Return the stored (lat, lon), either of which is None for a file without GPS
+    # data, or None if the file was not audited in its current state
+    def lookup(
+        self, path: Path, size: int, mtime_ns: int
+    ) -> Optional[tuple[Optional[float], Optional[float]]]:
+        row = self.connection.execute(
+            "SELECT latitude, longitude FROM audited"
+            " WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (str(path), size, mtime_ns),
+        ).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def record(
+        self,
+        path: Path,
+        size: int,
+        mtime_ns: int,
+        lat: Optional[float],
+        lon: Optional[float],
+    ) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO audited VALUES (?, ?, ?, ?, ?)",
+            (str(path), size, mtime_ns, lat, lon),
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self) -> None:
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
+
+
+# Yield (path, size, mtime_ns) for every JPEG under root, skipping hidden files
+# and directories
+def iter_jpegs(root: Path) -> Iterator[tuple[Path, int, int]]:
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_jpegs(Path(entry.path))
+            elif os.path.splitext(entry.name)[1].lower() in JPEG_SUFFIXES:
+                st = entry.stat()
+                yield Path(entry.path), st.st_size, st.st_mtime_ns
+
+
+# Runs in the worker processes
+def read_coordinates(path: Path) -> tuple[Optional[float], Optional[float]]:
+    coords = gps.lat_lon_from_metadata(path)
+    return coords if coords else (None, None)
+
+
+# Read the GPS position of every JPEG under roots that the state does not already
+# know about, and return the files whose position is inside a banned area. Roots
+# are resolved first, so the state matches whatever directory the audit runs from.
+def audit(roots: list[Path], state: AuditState, workers: Optional[int]) -> list[Path]:
+    coordinates = {}
+    pending = []
+    for root in roots:
+        for path, size, mtime_ns in iter_jpegs(root.resolve()):
+            known = state.lookup(path, size, mtime_ns)
+            if known is None:
+                pending.append((path, size, mtime_ns))
+            else:
+                coordinates[path] = known
+
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(
+            read_coordinates, [path for path, _, _ in pending], chunksize=CHUNK_SIZE
+        )
+        for (path, size, mtime_ns), (lat, lon) in tqdm(
+            zip(pending, results),
+            total=len(pending),
+            desc="Reading GPS",
+        ):
+            state.record(path, size, mtime_ns, lat, lon)
+            coordinates[path] = (lat, lon)
+    state.commit()
+
+    located = [
+        (path, lat, lon)
+        for path, (lat, lon) in coordinates.items()
+        if lat is not None and lon is not None
+    ]
+    if not located:
+        return []
+    inside = gps.get_banned_area_index().contains(
+        [lat for _, lat, _ in located], [lon for _, _, lon in located]
+    )
+    return sorted(path for (path, _, _), hit in zip(located, inside) if hit)
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Find JPEGs whose GPS position is inside a banned area."
+    )
+    parser.add_argument("roots", nargs="+", type=Path, help="Directories to audit.")
+    parser.add_argument(
+        "--scrub",
+        action="store_true",
+        help="Remove the GPS data from the files found, in place.",
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=DEFAULT_STATE_PATH,
+        help="SQLite file that lets an interrupted audit resume.",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Worker processes (defaults to the CPU count)."
+    )
+    args = parser.parse_args()
+
+    with AuditState(args.state) as state:
+        banned = audit(args.roots, state, args.workers)
+        print(f"Files inside banned areas: {len(banned)}")
+        for path in banned:
+            print(f"   {path}")
+
+        if args.scrub and banned:
+            scrubbed = 0
+            for path in tqdm(banned, desc="Scrubbing GPS"):
+                if gps.scrub_gps(path):
+                    scrubbed += 1
+                    st = path.stat()
+                    state.record(path, st.st_size, st.st_mtime_ns, None, None)
+            print(f"Scrubbed GPS data from {scrubbed} files")
+
+
+if __name__ == "__main__":
+    main()
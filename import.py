@@ -1,20 +1,115 @@
 from pathlib import Path
-from dataclasses import dataclass, field
-from typing import List
+from argparse import ArgumentParser
+from bisect import bisect_left, insort
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from dataclasses import dataclass, field, fields
+from typing import Callable, List, Optional
 import hashlib
-import shutil
 import subprocess
 import datetime
 import os
+import re
+import select
+import threading
 from tqdm import tqdm
 
-from config import load_config
+from config import ImportConfig, load_config
+from fileops import copy_and_hash
+from import_manifest import ImportManifest
+from inotify import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_IGNORED,
+    IN_ISDIR,
+    IN_MOVED_TO,
+    IN_ONLYDIR,
+    Inotify,
+)
+from staging import Migrator
+import exif
+import mp4
 
 
-# Compute SHA1 hash of a file
-def sha1sum(filename: Path):
+# Hash a file as stored on disk rather than as cached in memory: flush it, ask the
+# kernel to drop its cached pages, and drop them again afterwards
+def sha1sum_uncached(filename: Path):
     with open(filename, "rb", buffering=0) as f:
-        return hashlib.file_digest(f, "sha1").hexdigest()
+        fd = f.fileno()
+        if hasattr(os, "posix_fadvise"):
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        sha1 = hashlib.file_digest(f, "sha1").hexdigest()
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return sha1
+
+
+# Re-read a copied file and compare it to the digest computed while copying
+def verify_copy(path: Path, expected_sha1: str) -> Optional[str]:
+    try:
+        actual_sha1 = sha1sum_uncached(path)
+    except OSError as e:
+        return f"{path}: {e}"
+    if actual_sha1 != expected_sha1:
+        return f"{path}: expected {expected_sha1}, got {actual_sha1}"
+    return None
+
+
+# Verify every copy of an imported item. Only an item that checks out is recorded
+# in the manifest and, with a staging tier, handed to the migrator. If any copy
+# fails, the RAW and its JPEG are both deleted, dropped from the index and from
+# the manifest: the shot is found by its {date}_{stem} prefix, so a surviving
+# sibling would make the next import skip it instead of copying it again.
+def verify_item(
+    item: "ImportItem",
+    index: "DestinationIndex",
+    manifest: Optional[ImportManifest] = None,
+    migrator: Optional[Migrator] = None,
+) -> list[str]:
+    failures = [
+        failure
+        for failure in (verify_copy(path, sha1) for path, sha1 in item.copies())
+        if failure is not None
+    ]
+    if not failures:
+        record_item(item, index, manifest, migrator)
+        return []
+    for path, _ in item.copies():
+        path.unlink(missing_ok=True)
+        index.remove(path)
+    if manifest:
+        manifest.forget(item.path, item.size, item.mtime_ns)
+    return failures
+
+
+# Record a successfully copied item in the manifest and queue its staged copies
+def record_item(
+    item: "ImportItem",
+    index: "DestinationIndex",
+    manifest: Optional[ImportManifest] = None,
+    migrator: Optional[Migrator] = None,
+) -> None:
+    if manifest:
+        manifest.record(
+            item.path,
+            item.size,
+            item.mtime_ns,
+            item.sha1,
+            index.directory / item.destination.name,
+        )
+    if migrator:
+        migrator.enqueue([path for path, _ in item.copies()], index.directory)
+
+
+# Convert an EXIF "%Y:%m:%d %H:%M:%S" timestamp into our filename format
+def format_exif_datetime(value: str):
+    try:
+        dt = datetime.datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    return dt.strftime("%Y-%m-%d-%H-%M-%S")
 
 
 # Extract the datetime from the EXIF data using exiv2 CLI
@@ -26,15 +121,95 @@ def get_exif_datetime(image_path: Path):
         ).strip()
         if not output:
             return None
-        dt = datetime.datetime.strptime(output, "%Y:%m:%d %H:%M:%S")
-        return dt.strftime("%Y-%m-%d-%H-%M-%S")
-    except (subprocess.CalledProcessError, ValueError):
+        return format_exif_datetime(output)
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return None
+
+
+# Extract the datetimes of a batch of images in-process, falling back to exiv2
+# only for files the native reader cannot make sense of
+def read_exif_datetimes(image_paths: list[Path]) -> dict[Path, Optional[str]]:
+    datetimes = {}
+    for image_path in image_paths:
+        value = exif.datetime_original(image_path)
+        if value is None:
+            datetimes[image_path] = get_exif_datetime(image_path)
+        else:
+            datetimes[image_path] = format_exif_datetime(value)
+    return datetimes
+
+
+SHA1_RE = re.compile(r"[0-9a-f]{40}")
+
+
+# Sorted listing of a destination directory, read once with os.scandir and kept
+# up to date as files land, so prefix lookups never rescan the directory. With a
+# staging tier, new copies land in staging_directory and are migrated to directory
+# later, so both are listed and a file counts as present in either place.
+class DestinationIndex:
+    def __init__(self, directory: Path, staging_directory: Optional[Path] = None):
+        self.directory = directory
+        self.copy_directory = staging_directory or directory
+        self.copy_directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        names = set()
+        # Staging first: a file the migrator moves to directory meanwhile is then
+        # seen in one listing or the other
+        for listed_directory in dict.fromkeys([self.copy_directory, directory]):
+            with os.scandir(listed_directory) as entries:
+                names.update(
+                    entry.name for entry in entries if not entry.name.startswith(".")
+                )
+        self._names = sorted(names)
+        # Prefixes being copied right now, set once the copy has landed or failed
+        self._claims: dict[str, threading.Event] = {}
+
+    def _find(self, filename_prefix: str) -> Optional[Path]:
+        i = bisect_left(self._names, filename_prefix)
+        if i < len(self._names) and self._names[i].startswith(filename_prefix):
+            return self.directory / self._names[i]
         return None
 
+    # Find a file with the same date and filename prefix, if one was already
+    # imported. Returns its path in the final directory.
+    def find(self, filename_prefix: str) -> Optional[Path]:
+        with self._lock:
+            return self._find(filename_prefix)
+
+    # find() that also reserves the prefix when nothing is there, so two workers
+    # importing the same shot (e.g. both cards of a dual-slot camera) cannot both
+    # copy it. A caller that gets None must release() the prefix after copying;
+    # anyone else claiming it meanwhile waits and then sees the finished copy.
+    def claim(self, filename_prefix: str) -> Optional[Path]:
+        while True:
+            with self._lock:
+                existing = self._find(filename_prefix)
+                if existing is not None:
+                    return existing
+                claimed = self._claims.get(filename_prefix)
+                if claimed is None:
+                    self._claims[filename_prefix] = threading.Event()
+                    return None
+            claimed.wait()
+
+    def release(self, filename_prefix: str) -> None:
+        with self._lock:
+            self._claims.pop(filename_prefix).set()
+
+    def contains(self, name: str) -> bool:
+        with self._lock:
+            i = bisect_left(self._names, name)
+            return i < len(self._names) and self._names[i] == name
 
-# Check if a file with the same date and filename prefix already exists
-def file_already_exists(destination: Path, filename_prefix: str):
-    return any(destination.glob(f"{filename_prefix}*"))
+    def add(self, path: Path) -> None:
+        with self._lock:
+            insort(self._names, path.name)
+
+    def remove(self, path: Path) -> None:
+        with self._lock:
+            i = bisect_left(self._names, path.name)
+            if i < len(self._names) and self._names[i] == path.name:
+                del self._names[i]
 
 
 @dataclass
@@ -47,6 +222,13 @@ class Summary:
     no_raw_files: List[str] = field(default_factory=list)
     invalid_exif_files: List[str] = field(default_factory=list)
     unsupported_files: List[str] = field(default_factory=list)
+    verification_failures: List[str] = field(default_factory=list)
+
+    def merge(self, other: "Summary") -> None:
+        for summary_field in fields(self):
+            getattr(self, summary_field.name).extend(
+                getattr(other, summary_field.name)
+            )
 
     def __repr__(self):
         out = [
@@ -60,7 +242,7 @@ class Summary:
             return "\n".join("   " + x for x in files)
 
         if self.no_jpeg_files:
-            out.append("Files with no corresponding JPEG:")
+            out.append("Files with no corresponding JPEG and no readable date:")
             out.append(print_files(self.no_jpeg_files))
         if self.no_raw_files:
             out.append("JPEG files with no corresponding raw file:")
@@ -71,96 +253,637 @@ class Summary:
         if self.unsupported_files:
             out.append("Unsupported files:")
             out.append(print_files(self.unsupported_files))
+        if self.verification_failures:
+            out.append("Copies that failed verification:")
+            out.append(print_files(self.verification_failures))
 
         return "\n".join(out)
 
 
+# Limits how many copy tasks may touch the same physical device at once
+class DeviceLimiter:
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._lock = threading.Lock()
+        self._semaphores: dict[int, threading.BoundedSemaphore] = {}
+
+    def _semaphore(self, device: int) -> threading.BoundedSemaphore:
+        with self._lock:
+            if device not in self._semaphores:
+                self._semaphores[device] = threading.BoundedSemaphore(self.limit)
+            return self._semaphores[device]
+
+    # Acquire a slot on every device backing the given paths, in a fixed order
+    def acquire(self, *paths: Path) -> ExitStack:
+        stack = ExitStack()
+        for device in sorted({os.stat(path).st_dev for path in paths}):
+            stack.enter_context(self._semaphore(device))
+        return stack
+
+
+@dataclass
+class ImportItem:
+    index: int
+    path: Path
+    kind: str
+    jpg_path: Optional[Path] = None
+    size: int = 0
+    mtime: float = 0.0
+    mtime_ns: int = 0
+    datetime_taken: Optional[str] = None
+    # Videos were named from the file mtime before they were dated from mvhd
+    legacy_datetime_taken: Optional[str] = None
+    sha1: Optional[str] = None
+    destination: Optional[Path] = None
+    jpg_sha1: Optional[str] = None
+    jpg_destination: Optional[Path] = None
+    outcome: Optional[tuple[str, str]] = None
+
+    def set_stat(self, stat: os.stat_result) -> None:
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+
+    # The files this item was copied to, with their digests
+    def copies(self) -> list[tuple[Path, str]]:
+        copies = [(self.destination, self.sha1)]
+        if self.jpg_destination is not None:
+            copies.append((self.jpg_destination, self.jpg_sha1))
+        return copies
+
+    # Remember an already imported copy whose name carries the digest
+    def set_existing(self, existing: Path) -> None:
+        sha1 = existing.stem.rsplit("_", 1)[-1]
+        if SHA1_RE.fullmatch(sha1):
+            self.sha1 = sha1
+            self.destination = existing
+
+
+# Read a source directory once, grouping file names by stem so RAW/JPEG pairs can
+# be matched without probing the card. Returns the names in directory order and a
+# stem -> {lowercase suffix: file name} map.
+def list_source_files(source: Path) -> tuple[list[str], dict[str, dict[str, str]]]:
+    names = []
+    siblings: dict[str, dict[str, str]] = {}
+    with os.scandir(source) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or "." not in entry.name:
+                continue
+            if not entry.is_file():
+                continue
+            path = Path(entry.name)
+            names.append(entry.name)
+            siblings.setdefault(path.stem, {})[path.suffix.lower()] = entry.name
+    return names, siblings
+
+
+# Scan stage: classify a source file from its siblings and stat it
+def scan_file(
+    index: int,
+    file_path: Path,
+    siblings: dict[str, str],
+    supported_raw_formats: list[str],
+    supported_video_formats: list[str],
+) -> ImportItem:
+    suffix = file_path.suffix.lower()
+
+    if suffix in supported_video_formats:
+        item = ImportItem(index, file_path, "video")
+        item.set_stat(file_path.stat())
+        return item
+
+    if suffix == ".jpg":
+        # Handle JPEG files (check for corresponding RAW)
+        item = ImportItem(index, file_path, "jpg")
+        has_raw_file = sum(
+            1 for raw_suffix in supported_raw_formats if raw_suffix in siblings
+        )
+        if has_raw_file == 0:
+            item.outcome = ("no_raw_files", str(file_path))
+        elif has_raw_file > 1:
+            print(f"Multiple raw files found for {file_path}")
+        return item
+
+    if suffix in supported_raw_formats:
+        # RAW-only shots are imported too, dated from the RAW's own header
+        item = ImportItem(index, file_path, "raw")
+        if ".jpg" in siblings:
+            item.jpg_path = file_path.with_name(siblings[".jpg"])
+        item.set_stat(file_path.stat())
+        return item
+
+    return ImportItem(
+        index, file_path, "unsupported", outcome=("unsupported_files", file_path.name)
+    )
+
+
+METADATA_BATCH_SIZE = 64
+
+
+# How videos were dated before mvhd was read, and still the fallback
+def get_mtime_datetime(mtime: float) -> str:
+    return datetime.datetime.fromtimestamp(mtime).strftime("%Y-%m-%d-%H-%M-%S")
+
+
+# Date a video from its moov/mvhd creation time, which survives copying the card
+# around, falling back to the file's mtime
+def get_video_datetime(
+    video_path: Path, mtime: float, creation_time_is_utc: bool = True
+) -> str:
+    created = mp4.creation_time(video_path)
+    if created is None:
+        return get_mtime_datetime(mtime)
+    if creation_time_is_utc:
+        dt = created.astimezone()
+    else:
+        # Some cameras store local time in the field that should hold UTC
+        dt = created.replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%d-%H-%M-%S")
+
+
+# Metadata stage: work out when each file in a batch was taken. RAWs are dated from
+# their own header; the JPEG is only read if that fails.
+def read_capture_times(
+    items: list[ImportItem], video_times_are_utc: bool = True
+) -> list[ImportItem]:
+    raw_items = [item for item in items if item.kind == "raw"]
+    exif_datetimes = read_exif_datetimes([item.path for item in raw_items])
+    exif_datetimes.update(
+        read_exif_datetimes(
+            [
+                item.jpg_path
+                for item in raw_items
+                if not exif_datetimes[item.path] and item.jpg_path is not None
+            ]
+        )
+    )
+    for item in items:
+        if item.kind == "video":
+            item.datetime_taken = get_video_datetime(
+                item.path, item.mtime, video_times_are_utc
+            )
+            legacy_datetime_taken = get_mtime_datetime(item.mtime)
+            if legacy_datetime_taken != item.datetime_taken:
+                item.legacy_datetime_taken = legacy_datetime_taken
+        elif item.kind == "raw":
+            item.datetime_taken = exif_datetimes[item.path]
+            if not item.datetime_taken and item.jpg_path is not None:
+                item.datetime_taken = exif_datetimes[item.jpg_path]
+            if item.datetime_taken:
+                continue
+            if item.jpg_path is None:
+                item.outcome = ("no_jpeg_files", item.path.name)
+            else:
+                item.outcome = ("invalid_exif_files", item.jpg_path.name)
+    return items
+
+
+# Hash/copy stage: copy the file under its new name unless it already exists
+def hash_and_copy(
+    item: ImportItem,
+    photo_index: DestinationIndex,
+    video_index: DestinationIndex,
+    limiter: DeviceLimiter,
+) -> ImportItem:
+    suffix = item.path.suffix.lower()
+    new_base_filename = f"{item.datetime_taken}_{item.path.stem}"
+
+    if item.kind == "video":
+        existing = video_index.claim(new_base_filename)
+        if existing is None and item.legacy_datetime_taken:
+            # Imported before videos were dated from mvhd, under the mtime name
+            existing = video_index.find(
+                f"{item.legacy_datetime_taken}_{item.path.stem}"
+            )
+            if existing is not None:
+                video_index.release(new_base_filename)
+        if existing is not None:
+            item.set_existing(existing)
+            item.outcome = ("skipped_video_files", str(item.path))
+            return item
+        try:
+            with limiter.acquire(item.path, video_index.copy_directory):
+                item.destination, item.sha1 = copy_and_hash(
+                    item.path,
+                    video_index.copy_directory,
+                    lambda sha1: f"{new_base_filename}_{sha1}{suffix}",
+                )
+            video_index.add(item.destination)
+        finally:
+            video_index.release(new_base_filename)
+        item.outcome = ("successful_video_import", str(item.path))
+        return item
+
+    existing = photo_index.claim(new_base_filename)
+    if existing is not None:
+        item.set_existing(existing)
+        item.outcome = ("skipped_photo_files", str(item.path))
+        return item
+    try:
+        with limiter.acquire(item.path, photo_index.copy_directory):
+            item.destination, sha1 = copy_and_hash(
+                item.path,
+                photo_index.copy_directory,
+                lambda sha1: f"{new_base_filename}_{sha1}{suffix}",
+            )
+            if item.jpg_path is not None:
+                item.jpg_destination, item.jpg_sha1 = copy_and_hash(
+                    item.jpg_path,
+                    photo_index.copy_directory,
+                    lambda _: f"{new_base_filename}_{sha1}.jpg",
+                )
+        photo_index.add(item.destination)
+        if item.jpg_destination is not None:
+            photo_index.add(item.jpg_destination)
+    finally:
+        photo_index.release(new_base_filename)
+    item.sha1 = sha1
+    item.outcome = ("successful_photo_import", str(item.path))
+    return item
+
+
+# Skip a file the manifest says was imported before, as long as the copy is still
+# there (or still staged)
+def skip_if_imported(
+    item: ImportItem, manifest: ImportManifest, index: DestinationIndex
+) -> None:
+    previous = manifest.lookup(item.path, item.size, item.mtime_ns)
+    if previous is None or not index.contains(previous[1].name):
+        return
+    if item.kind == "video":
+        item.outcome = ("skipped_video_files", str(item.path))
+    else:
+        item.outcome = ("skipped_photo_files", str(item.path))
+
+
 def copy_and_rename_files(
     source: Path,
     photo_destination: Path,
     video_destination: Path,
     supported_raw_formats: list[str],
     supported_video_formats: list[str],
-):
+    *,
+    scan_workers: int = 4,
+    metadata_workers: int = 8,
+    copy_workers: int = 4,
+    device_io_limit: int = 2,
+    video_times_are_utc: bool = True,
+    limiter: Optional[DeviceLimiter] = None,
+    manifest: Optional[ImportManifest] = None,
+    indexes: Optional[dict[Path, DestinationIndex]] = None,
+    verify_pool: Optional[Executor] = None,
+    migrator: Optional[Migrator] = None,
+    progress_position: Optional[int] = None,
+    report: bool = True,
+) -> Summary:
     # Ensure destination directories exist
     photo_destination.mkdir(parents=True, exist_ok=True)
     video_destination.mkdir(parents=True, exist_ok=True)
 
+    if limiter is None:
+        limiter = DeviceLimiter(device_io_limit)
+    # Each destination is listed once per run, even across several source directories
+    if indexes is None:
+        indexes = {}
+    for destination in (photo_destination, video_destination):
+        if destination not in indexes:
+            indexes[destination] = DestinationIndex(
+                destination,
+                migrator.staged_directory(destination) if migrator else None,
+            )
+    photo_index = indexes[photo_destination]
+    video_index = indexes[video_destination]
+
     summary = Summary()
+    names, siblings = list_source_files(source)
 
-    # Process all files in the source directory
-    for file_path in tqdm(
-        list(source.glob("*.*")), desc="Processing files", dynamic_ncols=True
+    with (
+        ThreadPoolExecutor(scan_workers) as scan_pool,
+        ThreadPoolExecutor(metadata_workers) as metadata_pool,
+        ThreadPoolExecutor(copy_workers) as copy_pool,
+        tqdm(
+            total=len(names),
+            desc=(
+                "Processing files"
+                if progress_position is None
+                else f"Processing {source}"
+            ),
+            position=progress_position,
+            dynamic_ncols=True,
+        ) as progress,
     ):
-        suffix = file_path.suffix.lower()
-
-        if suffix in supported_video_formats:
-            # Handle video files
-            mtime = os.path.getmtime(file_path)
-            datetime_taken = datetime.datetime.fromtimestamp(mtime).strftime(
-                "%Y-%m-%d-%H-%M-%S"
+        # Each stage hands finished items straight to the next stage's pool
+        scan_futures = [
+            scan_pool.submit(
+                scan_file,
+                index,
+                source / name,
+                siblings[Path(name).stem],
+                supported_raw_formats,
+                supported_video_formats,
             )
-            sha1 = sha1sum(file_path)
-            new_base_filename = f"{datetime_taken}_{file_path.stem}"
-            if file_already_exists(video_destination, new_base_filename):
-                summary.skipped_video_files.append(str(file_path))
-                continue
-            new_filename = f"{new_base_filename}_{sha1}{suffix}"
-            shutil.copy2(file_path, video_destination / new_filename)
-            summary.successful_video_import.append(str(file_path))
-
-        elif suffix == ".jpg":
-            # Handle JPEG files (check for corresponding RAW)
-            has_raw_file = sum(
-                1
-                for raw_suffix in supported_raw_formats
-                if file_path.with_suffix(raw_suffix.upper()).exists()
+            for index, name in enumerate(names)
+        ]
+        items = []
+        batch = []
+        metadata_futures = []
+        for future in as_completed(scan_futures):
+            item = future.result()
+            items.append(item)
+            if item.outcome is None and item.kind in ("video", "raw") and manifest:
+                skip_if_imported(
+                    item, manifest, video_index if item.kind == "video" else photo_index
+                )
+            if item.outcome is None and item.kind in ("video", "raw"):
+                batch.append(item)
+                if len(batch) == METADATA_BATCH_SIZE:
+                    metadata_futures.append(
+                        metadata_pool.submit(
+                            read_capture_times, batch, video_times_are_utc
+                        )
+                    )
+                    batch = []
+            else:
+                progress.update()
+        if batch:
+            metadata_futures.append(
+                metadata_pool.submit(read_capture_times, batch, video_times_are_utc)
             )
-            if has_raw_file == 0:
-                summary.no_raw_files.append(str(file_path))
-            elif has_raw_file > 1:
-                print(f"Multiple raw files found for {file_path}")
-
-        elif suffix in supported_raw_formats:
-            # Handle RAW files
-            jpg_file_path = file_path.with_suffix(".JPG")
-            if not jpg_file_path.exists():
-                summary.no_jpeg_files.append(file_path.name)
-                continue
-            datetime_taken = get_exif_datetime(jpg_file_path)
-            if not datetime_taken:
-                summary.invalid_exif_files.append(jpg_file_path.name)
-                continue
-            new_base_filename = f"{datetime_taken}_{file_path.stem}"
-            if file_already_exists(photo_destination, new_base_filename):
-                summary.skipped_photo_files.append(str(file_path))
-                continue
-            sha1 = sha1sum(file_path)
-            new_filename = f"{new_base_filename}_{sha1}"
-            shutil.copy2(jpg_file_path, photo_destination / f"{new_filename}.jpg")
-            shutil.copy2(file_path, photo_destination / f"{new_filename}{suffix}")
-            summary.successful_photo_import.append(str(file_path))
 
-        else:
-            summary.unsupported_files.append(file_path.name)
+        copy_futures = []
+        for future in as_completed(metadata_futures):
+            for item in future.result():
+                if item.outcome is None:
+                    copy_futures.append(
+                        copy_pool.submit(
+                            hash_and_copy,
+                            item,
+                            photo_index,
+                            video_index,
+                            limiter,
+                        )
+                    )
+                else:
+                    progress.update()
 
-    print(summary)
+        # Verification re-reads each copy in the background while later files copy;
+        # items are recorded (and staged copies migrated) once verified, or
+        # straight away without --verify
+        verify_futures = []
+        for future in as_completed(copy_futures):
+            item = future.result()
+            index = video_index if item.kind == "video" else photo_index
+            if item.outcome[0].startswith("successful"):
+                if verify_pool:
+                    verify_futures.append(
+                        verify_pool.submit(verify_item, item, index, manifest, migrator)
+                    )
+                else:
+                    record_item(item, index, manifest, migrator)
+            elif manifest and item.sha1 is not None:
+                # Skipped as already imported under a name carrying the digest
+                manifest.record(
+                    item.path, item.size, item.mtime_ns, item.sha1, item.destination
+                )
+            progress.update()
 
+        summary.verification_failures = sorted(
+            failure for future in verify_futures for failure in future.result()
+        )
 
-def main():
-    app_config = load_config()
-    config = app_config.import_config
+    if manifest:
+        manifest.commit()
+
+    # Report in source order so the summary does not depend on scheduling
+    for item in sorted(items, key=lambda item: item.index):
+        if item.outcome is not None:
+            field_name, value = item.outcome
+            getattr(summary, field_name).append(value)
+
+    if report:
+        print(summary)
+    return summary
 
-    # Process each subdirectory in the camera directory
-    for source_dir in config.camera_dir.glob("*/"):
-        if source_dir.is_dir():
+
+# Group source directories by the device they live on
+def group_by_device(source_dirs: list[Path]) -> list[list[Path]]:
+    devices: dict[int, list[Path]] = {}
+    for source_dir in source_dirs:
+        devices.setdefault(source_dir.stat().st_dev, []).append(source_dir)
+    return list(devices.values())
+
+
+# Import the directories of one device one after another, merging their summaries
+def import_device(
+    source_dirs: list[Path], config: ImportConfig, position: int, **kwargs
+) -> Summary:
+    summary = Summary()
+    for source_dir in source_dirs:
+        summary.merge(
             copy_and_rename_files(
                 source_dir,
                 config.photo_destination,
                 config.video_destination,
                 config.supported_raw_formats,
                 config.supported_video_formats,
+                scan_workers=config.scan_workers,
+                metadata_workers=config.metadata_workers,
+                copy_workers=config.copy_workers,
+                device_io_limit=config.device_io_limit,
+                video_times_are_utc=config.video_times_are_utc,
+                progress_position=position,
+                report=False,
+                **kwargs,
+            )
+        )
+    return summary
+
+
+# Import several source directories, one worker per device. Devices are imported
+# in parallel; directories on the same device in turn.
+def import_sources(
+    source_dirs: list[Path], config: ImportConfig, **kwargs
+) -> Summary:
+    devices = group_by_device(source_dirs)
+    summary = Summary()
+    with ThreadPoolExecutor(max(1, len(devices))) as device_pool:
+        futures = [
+            device_pool.submit(import_device, device_dirs, config, position, **kwargs)
+            for position, device_dirs in enumerate(devices)
+        ]
+        for future in futures:
+            summary.merge(future.result())
+    return summary
+
+
+def list_source_dirs(camera_dir: Path) -> list[Path]:
+    return [
+        source_dir for source_dir in sorted(camera_dir.glob("*/")) if source_dir.is_dir()
+    ]
+
+
+WATCH_SETTLE_SECONDS = 2.0
+
+
+# Wait for cards to be mounted and files to land under the camera directories, and
+# hand the affected source directories to import_batch once things have been quiet
+# for WATCH_SETTLE_SECONDS. Runs until interrupted.
+def watch_camera_dirs(
+    camera_dirs: list[Path], import_batch: Callable[[list[Path]], None]
+) -> None:
+    watched: dict[int, Path] = {}
+    pending: set[Path] = set()
+
+    with Inotify() as notifier, open("/proc/self/mounts") as mounts:
+
+        def add_watch(path: Path, mask: int) -> bool:
+            try:
+                watched[notifier.add_watch(path, mask | IN_ONLYDIR)] = path
+            except OSError:
+                return False
+            return True
+
+        # Watch the nearest existing parent of each camera directory, the camera
+        # directory itself, and every source directory on it. Source directories
+        # seen for the first time (a new card, or a remount) are queued for import.
+        def refresh() -> None:
+            watched_paths = set(watched.values())
+            for camera_dir in camera_dirs:
+                parent = camera_dir.parent
+                while not parent.is_dir():
+                    parent = parent.parent
+                add_watch(parent, IN_CREATE | IN_MOVED_TO)
+                if not camera_dir.is_dir():
+                    continue
+                add_watch(camera_dir, IN_CREATE | IN_MOVED_TO)
+                for source_dir in list_source_dirs(camera_dir):
+                    if source_dir in watched_paths:
+                        continue
+                    if add_watch(source_dir, IN_CLOSE_WRITE | IN_MOVED_TO):
+                        pending.add(source_dir)
+
+        poller = select.poll()
+        poller.register(notifier, select.POLLIN)
+        # /proc/self/mounts reports POLLPRI whenever the mount table changes
+        poller.register(mounts, select.POLLPRI)
+        mounts.read()
+        refresh()
+
+        print(f"Watching {', '.join(str(d) for d in camera_dirs)}", flush=True)
+        while True:
+            timeout = WATCH_SETTLE_SECONDS * 1000 if pending else None
+            ready = poller.poll(timeout)
+            if not ready:
+                batch = sorted(path for path in pending if path.is_dir())
+                pending.clear()
+                if batch:
+                    import_batch(batch)
+                continue
+
+            needs_refresh = False
+            for fd, _ in ready:
+                if fd != notifier.fileno():
+                    mounts.seek(0)
+                    mounts.read()
+                    needs_refresh = True
+                    continue
+                for event in notifier.read_events():
+                    path = watched.get(event.wd)
+                    if event.mask & IN_IGNORED:
+                        watched.pop(event.wd, None)
+                    elif event.mask & IN_ISDIR:
+                        needs_refresh = True
+                    elif path is not None and path.parent in camera_dirs:
+                        pending.add(path)
+            if needs_refresh:
+                refresh()
+
+
+def main():
+    parser = ArgumentParser(description="Import photos and videos from the camera.")
+    parser.add_argument(
+        "camera_dirs",
+        nargs="*",
+        type=Path,
+        help="Card directories to import from (defaults to import.camera_dir).",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Re-read every copy from the destination and check it against its SHA1.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and import cards and new files as soon as they appear.",
+    )
+    args = parser.parse_args()
+
+    app_config = load_config()
+    config = app_config.import_config
+    camera_dirs = args.camera_dirs or [config.camera_dir]
+
+    config.photo_destination.mkdir(parents=True, exist_ok=True)
+    config.video_destination.mkdir(parents=True, exist_ok=True)
+    migrator = Migrator(config.staging_dir) if config.staging_dir else None
+    limiter = DeviceLimiter(config.device_io_limit)
+    indexes = {
+        destination: DestinationIndex(
+            destination, migrator.staged_directory(destination) if migrator else None
+        )
+        for destination in (config.photo_destination, config.video_destination)
+    }
+    verify_pool = ThreadPoolExecutor(config.verify_workers) if args.verify else None
+
+    with ImportManifest(config.manifest_path) as manifest:
+
+        def import_batch(source_dirs: list[Path]) -> None:
+            print(
+                import_sources(
+                    source_dirs,
+                    config,
+                    limiter=limiter,
+                    manifest=manifest,
+                    indexes=indexes,
+                    verify_pool=verify_pool,
+                    migrator=migrator,
+                ),
+                flush=True,
+            )
+
+        # A card pulled or unmounted mid-import must not end --watch; whatever was
+        # not copied is picked up when the card is mounted again
+        def watch_batch(source_dirs: list[Path]) -> None:
+            try:
+                import_batch(source_dirs)
+            except OSError as e:
+                print(f"Import interrupted: {e}", flush=True)
+
+        if args.watch:
+            try:
+                watch_camera_dirs(camera_dirs, watch_batch)
+            except KeyboardInterrupt:
+                pass
+        else:
+            import_batch(
+                [
+                    source_dir
+                    for camera_dir in camera_dirs
+                    for source_dir in list_source_dirs(camera_dir)
+                ]
+            )
+    if verify_pool:
+        verify_pool.shutdown()
+    if migrator:
+        # The card is free by now; what is left is staging -> destination traffic
+        if migrator.pending():
+            print(
+                f"Moving {migrator.pending()} staged files to their destination...",
+                flush=True,
             )
+        migrator.close()
+        for failure in migrator.failures:
+            print(f"   Could not migrate {failure}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+import sqlite3
+import threading
+
+
+# Remembers which source files were already imported, keyed by path, size and mtime,
+# so unchanged files on a card can be skipped without hashing or reading EXIF.
+# Safe to share between the threads importing from different devices.
+class ImportManifest:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS imported (
+                source TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha1 TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                PRIMARY KEY (source, size, mtime_ns)
+            )
+            """
+        )
+
+    def __enter__(self) -> "ImportManifest":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Return (sha1, destination) of a previous import of this exact file, if any
+    def lookup(
+        self, source: Path, size: int, mtime_ns: int
+    ) -> Optional[tuple[str, Path]]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT sha1, destination FROM imported"
+                " WHERE source = ? AND size = ? AND mtime_ns = ?",
+                (str(source.absolute()), size, mtime_ns),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], Path(row[1])
+
+    def record(
+        self, source: Path, size: int, mtime_ns: int, sha1: str, destination: Path
+    ) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO imported VALUES (?, ?, ?, ?, ?)",
+                (str(source.absolute()), size, mtime_ns, sha1, str(destination)),
+            )
+
+    def forget(self, source: Path, size: int, mtime_ns: int) -> None:
+        with self._lock:
+            self.connection.execute(
+                "DELETE FROM imported WHERE source = ? AND size = ? AND mtime_ns = ?",
+                (str(source.absolute()), size, mtime_ns),
+            )
+
+    def commit(self) -> None:
+        with self._lock:
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.commit()
+            self.connection.close()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import NamedTuple
+import ctypes
+import ctypes.util
+import os
+import struct
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+
+class InotifyEvent(NamedTuple):
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+
+def _check(result: int) -> int:
+    if result < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+    return result
+
+
+# Minimal non-blocking wrapper around the Linux inotify API
+class Inotify:
+    def __init__(self):
+        if not hasattr(_libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.fd = _check(_libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC))
+
+    def __enter__(self) -> "Inotify":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: Path | str, mask: int) -> int:
+        return _check(_libc.inotify_add_watch(self.fd, os.fsencode(path), mask))
+
+    # Return every event queued so far, without blocking
+    def read_events(self) -> list[InotifyEvent]:
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\x00")
+                offset += length
+                events.append(InotifyEvent(wd, mask, cookie, os.fsdecode(name)))
+
+    def close(self) -> None:
+        os.close(self.fd)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import BinaryIO, Iterator
+import datetime
+import os
+import struct
+
+
+# QuickTime and MP4 timestamps count seconds from 1904-01-01 UTC
+MP4_EPOCH = datetime.datetime(1904, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+# Yield (type, payload start, payload end) for the ISO BMFF boxes in [start, end).
+# Only box headers are read, so walking past a multi-GB mdat costs one seek.
+def iter_boxes(f: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", f.read(8))
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            return
+        yield kind, offset + header_size, offset + size
+        offset += size
+
+
+# Read the creation time from the moov/mvhd box of a MOV/MP4 file, without touching
+# the media data. Returns an aware UTC datetime, or None if there is none.
+def creation_time(path: Path | str) -> datetime.datetime | None:
+    try:
+        with open(path, "rb", buffering=0) as f:
+            file_size = os.fstat(f.fileno()).st_size
+            for kind, start, end in iter_boxes(f, 0, file_size):
+                if kind != b"moov":
+                    continue
+                for kind, start, end in iter_boxes(f, start, end):
+                    if kind != b"mvhd":
+                        continue
+                    f.seek(start)
+                    header = f.read(12)
+                    if header[0] == 1:
+                        (seconds,) = struct.unpack(">Q", header[4:12])
+                    else:
+                        (seconds,) = struct.unpack(">I", header[4:8])
+                    if seconds == 0:
+                        return None
+                    return MP4_EPOCH + datetime.timedelta(seconds=seconds)
+                return None
+    except (OSError, struct.error, IndexError, OverflowError):
+        return None
+    return None
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any
+import subprocess
+import sys
+import threading
+
+import requests
+
+from config import UploadConfig
+
+
+DEFAULT_RC_URL = "http://localhost:5572"
+# Seconds to wait for the daemon to accept a connection before falling back
+_CONNECT_TIMEOUT = 1.0
+
+
+# Client for a long-lived `rclone rcd` daemon. Uploads go over its HTTP API on a
+# single requests.Session, so the rclone startup, config parsing and the TLS
+# connection to the remote are paid once per daemon rather than once per file.
+class RcloneRC:
+    def __init__(
+        self,
+        url: str = DEFAULT_RC_URL,
+        user: str | None = None,
+        password: str | None = None,
+    ):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        if user is not None:
+            self.session.auth = (user, password or "")
+        self._lock = threading.Lock()
+        self._available: bool | None = None
+
+    def call(self, command: str, *, timeout: float | None = 30, **kwargs: Any) -> Any:
+        response = self.session.post(
+            f"{self.url}/{command}", timeout=(_CONNECT_TIMEOUT, timeout), **kwargs
+        )
+        if response.status_code >= 400:
+            try:
+                error = response.json().get("error", response.text)
+            except ValueError:
+                error = response.text
+            raise RuntimeError(f"rclone rc {command} failed: {error}")
+        return response.json()
+
+    # Whether a daemon answers at url; checked once, then remembered
+    def available(self) -> bool:
+        with self._lock:
+            if self._available is None:
+                try:
+                    self.call("rc/noop", json={}, timeout=5)
+                    self._available = True
+                except (requests.RequestException, RuntimeError):
+                    self._available = False
+            return self._available
+
+    def mark_unavailable(self) -> None:
+        with self._lock:
+            self._available = False
+
+    # Upload data as filename in the remote directory destination, e.g.
+    # "b2:your-bucket" or a local path
+    def upload(self, destination: str, filename: str, data: bytes) -> None:
+        self.call(
+            "operations/uploadfile",
+            params={"fs": destination, "remote": ""},
+            files={"file0": (filename, data)},
+            timeout=None,
+        )
+
+
+@lru_cache(maxsize=None)
+def get_client(url: str, user: str | None, password: str | None) -> RcloneRC:
+    return RcloneRC(url, user, password)
+
+
+def _rcat(destination: str, filename: str, data: bytes) -> bool:
+    result = subprocess.run(
+        ["rclone", "rcat", "--size", str(len(data)), f"{destination}/{filename}"],
+        input=data,
+    )
+    return result.returncode == 0
+
+
+# Upload data as destination/filename through the rclone daemon at
+# config.rclone_rc_url if one is running, and by spawning `rclone rcat` otherwise.
+# Returns True if the upload succeeded.
+def upload_bytes(config: UploadConfig, filename: str, data: bytes) -> bool:
+    client = get_client(
+        config.rclone_rc_url, config.rclone_rc_user, config.rclone_rc_pass
+    )
+    if client.available():
+        try:
+            client.upload(config.rclone_destination, filename, data)
+            return True
+        except requests.ConnectionError:
+            # The daemon went away; use the subprocess path from now on
+            client.mark_unavailable()
+        except (requests.RequestException, RuntimeError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return False
+    return _rcat(config.rclone_destination, filename, data)
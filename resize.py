@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from pathlib import Path
+import math
+
+from PIL import Image, ImageOps
+
+
+# JPEGs are decoded at the smallest DCT scale (1/2, 1/4 or 1/8) that still leaves
+# at least this many times the target size, so the LANCZOS pass that follows has
+# several real pixels per output pixel and the result looks the same as from a
+# full decode
+DRAFT_OVERSAMPLING = 2
+
+
+# Open an image, shrink it to fit within max_dimension x max_dimension and return
+# it upright. JPEGs are never decoded at full resolution (Image.draft), and the
+# EXIF orientation is applied to the small image instead of the full-size pixels.
+# The bounding box is square, so downscaling before rotating gives the same size.
+def downscale(path: Path | str, max_dimension: int) -> Image.Image:
+    with Image.open(path) as img:
+        # draft() picks the scale from the tighter side, so ask for the image's own
+        # aspect ratio with the long side at the oversampled target
+        scale = max_dimension * DRAFT_OVERSAMPLING / max(img.size)
+        img.draft(None, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        return ImageOps.exif_transpose(img)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+
+from fileops import cached_sha1, copy_file
+
+
+JOURNAL_NAME = ".pupphoto_migration.sqlite3"
+
+
+# Move one staged file into its final directory. Within a filesystem this is a
+# rename; otherwise the file is copied to a temporary name, flushed, renamed into
+# place, and only then removed from staging. Safe to repeat after a crash.
+def migrate_file(staged: Path, destination: Path) -> Path:
+    final = destination / staged.name
+    if not staged.exists():
+        return final
+    destination.mkdir(parents=True, exist_ok=True)
+    if staged.stat().st_dev == destination.stat().st_dev:
+        os.replace(staged, final)
+        return final
+    tmp = destination / f".{staged.name}.part"
+    copy_file(staged, tmp)
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, final)
+    staged.unlink()
+    return final
+
+
+# Whether a staged file still matches the digest cached on it while copying. Files
+# without one (no user xattrs on the staging filesystem) are trusted.
+def _matches_cached_sha1(staged: Path) -> bool:
+    expected_sha1 = cached_sha1(staged)
+    if expected_sha1 is None:
+        return True
+    with open(staged, "rb") as f:
+        return hashlib.file_digest(f, "sha1").hexdigest() == expected_sha1
+
+
+# Moves files from the fast staging directory to their final destination in a
+# background thread. Every queued move is written to a journal in the staging
+# directory first, and moves left over from an interrupted run are resumed, along
+# with staged files that never made it into the journal.
+class Migrator:
+    def __init__(self, staging_dir: Path):
+        self.staging_dir = staging_dir
+        staging_dir.mkdir(parents=True, exist_ok=True)
+        self.failures: list[str] = []
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[Optional[tuple[Path, Path]]] = queue.Queue()
+        self.connection = sqlite3.connect(
+            staging_dir / JOURNAL_NAME, check_same_thread=False
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending (
+                staged TEXT PRIMARY KEY,
+                destination TEXT NOT NULL
+            )
+            """
+        )
+        self._recover()
+        for staged, destination in self.connection.execute(
+            "SELECT staged, destination FROM pending ORDER BY rowid"
+        ):
+            self._queue.put((Path(staged), Path(destination)))
+        self._thread = threading.Thread(target=self._run, name="migrator", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "Migrator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Where files bound for destination are staged: the destination's absolute path
+    # mirrored under the staging directory
+    def staged_directory(self, destination: Path) -> Path:
+        destination = destination.absolute()
+        return self.staging_dir / destination.relative_to(destination.anchor)
+
+    def _destination(self, staged_directory: Path) -> Path:
+        return Path(os.sep) / staged_directory.relative_to(self.staging_dir)
+
+    # Journal staged files that have no row: copies made by a run that died before
+    # queueing them. The RAW and JPEG of a shot share a stem and are handled as one:
+    # if either no longer matches the digest cached on it while copying, both are
+    # deleted along with their journal rows, so the next import copies the shot
+    # from the card again. Runs before anything lists the staging directory.
+    def _recover(self) -> None:
+        journaled = {
+            staged
+            for (staged,) in self.connection.execute("SELECT staged FROM pending")
+        }
+        for directory, _, names in os.walk(self.staging_dir):
+            staged_directory = Path(directory)
+            if staged_directory == self.staging_dir:
+                continue
+            shots: dict[str, list[Path]] = {}
+            for name in names:
+                staged = staged_directory / name
+                if name.startswith("."):
+                    # Temporary files of interrupted copies
+                    if name.endswith(".part"):
+                        staged.unlink(missing_ok=True)
+                    continue
+                shots.setdefault(staged.stem, []).append(staged)
+            for files in shots.values():
+                unjournaled = [
+                    staged for staged in files if str(staged) not in journaled
+                ]
+                if not unjournaled:
+                    continue
+                if all(_matches_cached_sha1(staged) for staged in unjournaled):
+                    self.connection.executemany(
+                        "INSERT INTO pending VALUES (?, ?)",
+                        [
+                            (str(staged), str(self._destination(staged_directory)))
+                            for staged in unjournaled
+                        ],
+                    )
+                    continue
+                for staged in files:
+                    staged.unlink(missing_ok=True)
+                    self.connection.execute(
+                        "DELETE FROM pending WHERE staged = ?", (str(staged),)
+                    )
+        self.connection.commit()
+
+    # Queue the staged copies of one shot, journaled in a single transaction so a
+    # RAW is never migrated without its JPEG being journaled too
+    def enqueue(self, staged_files: list[Path], destination: Path) -> None:
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO pending VALUES (?, ?)",
+                [(str(staged), str(destination)) for staged in staged_files],
+            )
+            self.connection.commit()
+        for staged in staged_files:
+            self._queue.put((staged, destination))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while (job := self._queue.get()) is not None:
+            staged, destination = job
+            try:
+                migrate_file(staged, destination)
+            except OSError as e:
+                # Left in the journal, so the next run tries again
+                self.failures.append(f"{staged}: {e}")
+                continue
+            with self._lock:
+                self.connection.execute(
+                    "DELETE FROM pending WHERE staged = ?", (str(staged),)
+                )
+                self.connection.commit()
+
+    # Wait for every queued move to finish
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,146 @@
+import struct
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational, ImageFileDirectory_v2
+
+import exif
+import gps
+
+
+TAKEN = "2024:01:02 03:04:05"
+GPS_TAGS = {
+    1: "N",
+    2: (IFDRational(37), IFDRational(15), IFDRational(4241, 100)),
+    3: "W",
+    4: (IFDRational(121), IFDRational(54), IFDRational(5449, 100)),
+}
+
+
+def pixels() -> Image.Image:
+    return Image.new("RGB", (64, 48), (10, 20, 30))
+
+
+def jpeg_bytes() -> bytes:
+    metadata = Image.Exif()
+    metadata.get_ifd(exif.TAG_EXIF_IFD)[exif.TAG_DATETIME_ORIGINAL] = TAKEN
+    metadata.get_ifd(exif.TAG_GPS_IFD).update(GPS_TAGS)
+    output = BytesIO()
+    pixels().save(output, format="JPEG", exif=metadata.tobytes(), quality=90)
+    return output.getvalue()
+
+
+# A minimal Fujifilm RAF: the header, the JPEG preview carrying the EXIF data, and
+# a payload standing in for the sensor data
+def raf_bytes() -> bytes:
+    jpeg = jpeg_bytes()
+    header = b"FUJIFILMCCD-RAW 0201FF383501".ljust(exif.RAF_JPEG_OFFSET, b"\x00")
+    jpeg_offset = len(header) + 8
+    payload = bytes(range(256)) * 16
+    return header + struct.pack(">II", jpeg_offset, len(jpeg)) + jpeg + payload
+
+
+# DNG is TIFF-based: IFD0 points at the GPS IFD and at the image strips
+def dng_bytes() -> bytes:
+    info = ImageFileDirectory_v2()
+    info[exif.TAG_EXIF_IFD] = {exif.TAG_DATETIME_ORIGINAL: TAKEN}
+    info[exif.TAG_GPS_IFD] = GPS_TAGS
+    output = BytesIO()
+    pixels().save(output, format="TIFF", tiffinfo=info)
+    return output.getvalue()
+
+
+FIXTURES = {"jpg": jpeg_bytes, "raf": raf_bytes, "dng": dng_bytes}
+
+
+# File offsets of the TIFF structure that carries the metadata. For a DNG that is
+# the whole file, so the image strips are checked separately.
+def tiff_block(data: bytes) -> range:
+    tiff, base, _ = exif._open_tiff(BytesIO(data), b"CMT4")
+    return range(base, base + len(tiff.data))
+
+
+def strip_ranges(data: bytes) -> list[range]:
+    with Image.open(BytesIO(data)) as img:
+        offsets = img.tag_v2[273]
+        counts = img.tag_v2[279]
+    return [range(offset, offset + count) for offset, count in zip(offsets, counts)]
+
+
+def changed_offsets(before: bytes, after: bytes) -> list[int]:
+    assert len(before) == len(after)
+    return [i for i, (old, new) in enumerate(zip(before, after)) if old != new]
+
+
+def assert_only_gps_removed(suffix: str, before: bytes, after: bytes) -> None:
+    changed = changed_offsets(before, after)
+    assert changed
+    block = tiff_block(before)
+    assert all(offset in block for offset in changed)
+    if suffix == "dng":
+        for strip in strip_ranges(before):
+            assert not any(offset in strip for offset in changed)
+
+    assert gps._read_exact_lat_lon(BytesIO(after)) is None
+    found = exif.open_exif_ifd(BytesIO(after))
+    assert found is not None
+    tiff, exif_ifd = found
+    assert tiff.value(exif_ifd[exif.TAG_DATETIME_ORIGINAL]).strip() == TAKEN
+
+
+@pytest.fixture(params=sorted(FIXTURES))
+def image(request, tmp_path: Path) -> tuple[str, Path]:
+    path = tmp_path / f"photo.{request.param}"
+    path.write_bytes(FIXTURES[request.param]())
+    return request.param, path
+
+
+def test_fixture_has_gps(image):
+    _, path = image
+    lat, lon = gps.lat_lon_from_metadata(path)
+    assert lat == pytest.approx(37.26178, abs=1e-5)
+    assert lon == pytest.approx(-121.91514, abs=1e-5)
+
+
+def test_remove_gps_ifd_changes_only_the_tiff_block(image):
+    suffix, path = image
+    before = path.read_bytes()
+    assert exif.remove_gps_ifd(path)
+    after = path.read_bytes()
+    assert_only_gps_removed(suffix, before, after)
+    assert gps.lat_lon_from_metadata(path) is None
+
+    # Nothing left to remove the second time
+    assert not exif.remove_gps_ifd(path)
+    assert path.read_bytes() == after
+
+
+def test_remove_gps_from_buffer_matches_file(image):
+    suffix, path = image
+    before = path.read_bytes()
+    buffer = bytearray(before)
+    assert exif.remove_gps_from_buffer(buffer)
+    assert_only_gps_removed(suffix, before, bytes(buffer))
+
+    exif.remove_gps_ifd(path)
+    assert bytes(buffer) == path.read_bytes()
+
+
+def test_pixels_survive(image):
+    suffix, path = image
+    if suffix == "raf":
+        pytest.skip("Pillow cannot decode RAF")
+    with Image.open(path) as img:
+        expected = img.tobytes()
+    exif.remove_gps_ifd(path)
+    with Image.open(path) as img:
+        assert img.tobytes() == expected
+
+
+def test_unparseable_buffer_raises():
+    output = BytesIO()
+    pixels().save(output, format="PNG")
+    with pytest.raises(exif.ExifError):
+        exif.remove_gps_from_buffer(bytearray(output.getvalue()))
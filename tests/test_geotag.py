@@ -0,0 +1,20 @@
+import subprocess
+from pathlib import Path
+
+import geotag
+
+
+def test_failed_write_does_not_stop_the_others(monkeypatch, tmp_path):
+    def exiv2(arguments, **kwargs):
+        returncode = 1 if arguments[-1].endswith("bad.jpg") else 0
+        return subprocess.CompletedProcess(arguments, returncode, "", "corrupt file")
+
+    monkeypatch.setattr(geotag.subprocess, "run", exiv2)
+    photos = [tmp_path / name for name in ("a.jpg", "bad.jpg", "c.jpg")]
+    failures = geotag.write_positions([(path, 37.0, -122.0) for path in photos])
+    assert failures == [f"{tmp_path / 'bad.jpg'}: corrupt file"]
+
+
+def test_missing_exiv2_is_reported(monkeypatch):
+    monkeypatch.setenv("PATH", "")
+    assert geotag.write_position(Path("photo.jpg"), 37.0, -122.0) is not None
@@ -0,0 +1,49 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import exif
+import gps
+from config import BannedArea
+from test_exif import jpeg_bytes
+
+
+@pytest.fixture(autouse=True)
+def banned_areas():
+    gps.set_banned_areas([BannedArea("home", 37.26178, -121.9151247, 500)])
+
+
+def encode(format: str) -> bytearray:
+    output = BytesIO()
+    Image.new("RGB", (8, 8)).save(output, format=format)
+    return bytearray(output.getvalue())
+
+
+def test_buffer_inside_banned_area_is_scrubbed_in_place():
+    buffer = bytearray(jpeg_bytes())
+    scrubbed, removed = gps.remove_gps_from_buffer_if_banned(buffer, ".jpg")
+    assert removed
+    assert scrubbed is buffer
+    assert gps._read_exact_lat_lon(BytesIO(buffer)) is None
+
+
+def test_buffer_outside_banned_areas_is_untouched():
+    gps.set_banned_areas([])
+    buffer = bytearray(jpeg_bytes())
+    original = bytes(buffer)
+    scrubbed, removed = gps.remove_gps_from_buffer_if_banned(buffer, ".jpg")
+    assert not removed
+    assert scrubbed == original
+
+
+def test_jpeg_without_exif_needs_no_exiv2(monkeypatch):
+    monkeypatch.setattr(gps.shutil, "which", lambda name: None)
+    buffer = encode("JPEG")
+    assert gps.remove_gps_from_buffer_if_banned(buffer, ".jpg") == (buffer, False)
+
+
+def test_unparseable_buffer_is_refused_without_exiv2(monkeypatch):
+    monkeypatch.setattr(gps.shutil, "which", lambda name: None)
+    with pytest.raises(exif.ExifError):
+        gps.remove_gps_from_buffer_if_banned(encode("PNG"), ".png")
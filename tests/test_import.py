@@ -0,0 +1,93 @@
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from import_manifest import ImportManifest
+from staging import Migrator
+from test_exif import jpeg_bytes, raf_bytes
+
+import_module = importlib.import_module("import")
+
+
+@pytest.fixture
+def card(tmp_path: Path) -> Path:
+    source = tmp_path / "card" / "100_FUJI"
+    source.mkdir(parents=True)
+    (source / "DSCF0001.RAF").write_bytes(raf_bytes())
+    (source / "DSCF0001.JPG").write_bytes(jpeg_bytes())
+    return source
+
+
+# Make --verify report a mismatch for copies with the given suffix
+def fail_verification(monkeypatch, suffix: str) -> None:
+    sha1sum_uncached = import_module.sha1sum_uncached
+
+    def corrupted(path: Path) -> str:
+        if path.suffix.lower() == suffix:
+            return "0" * 40
+        return sha1sum_uncached(path)
+
+    monkeypatch.setattr(import_module, "sha1sum_uncached", corrupted)
+
+
+def run_import(source: Path, tmp_path: Path, verify: bool = True, **kwargs):
+    with (
+        ImportManifest(tmp_path / "manifest.sqlite3") as manifest,
+        ThreadPoolExecutor(2) as verify_pool,
+    ):
+        return import_module.copy_and_rename_files(
+            source,
+            tmp_path / "photos",
+            tmp_path / "videos",
+            [".raf"],
+            [".mov"],
+            manifest=manifest,
+            verify_pool=verify_pool if verify else None,
+            report=False,
+            **kwargs,
+        )
+
+
+def test_failed_verification_is_imported_again(card, tmp_path, monkeypatch):
+    video = card / "DSCF0002.MOV"
+    video.write_bytes(bytes(4096))
+    with monkeypatch.context() as patch:
+        fail_verification(patch, ".mov")
+        summary = run_import(card, tmp_path)
+    assert len(summary.verification_failures) == 1
+    assert not list((tmp_path / "videos").iterdir())
+
+    summary = run_import(card, tmp_path)
+    assert summary.successful_video_import == [str(video)]
+    assert not summary.verification_failures
+    assert len(list((tmp_path / "videos").iterdir())) == 1
+
+    summary = run_import(card, tmp_path)
+    assert summary.skipped_video_files == [str(video)]
+
+
+@pytest.mark.parametrize("staged", [False, True], ids=["direct", "staged"])
+@pytest.mark.parametrize("failing", [".raf", ".jpg"])
+def test_failed_pair_is_imported_again(card, tmp_path, monkeypatch, failing, staged):
+    def import_card():
+        migrator = Migrator(tmp_path / "staging") if staged else None
+        try:
+            return run_import(card, tmp_path, migrator=migrator)
+        finally:
+            if migrator:
+                migrator.close()
+
+    with monkeypatch.context() as patch:
+        fail_verification(patch, failing)
+        summary = import_card()
+    assert len(summary.verification_failures) == 1
+    assert not list((tmp_path / "photos").iterdir())
+
+    summary = import_card()
+    assert summary.successful_photo_import == [str(card / "DSCF0001.RAF")]
+    assert sorted(path.suffix for path in (tmp_path / "photos").iterdir()) == [
+        ".jpg",
+        ".raf",
+    ]
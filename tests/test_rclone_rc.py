@@ -0,0 +1,139 @@
+import base64
+import email
+import email.policy
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import rclone_rc
+from config import UploadConfig
+
+
+USER = "pupphoto"
+PASSWORD = "secret"
+
+
+# Stands in for `rclone rcd --rc-user ... --rc-pass ...`: answers rc/noop and
+# writes operations/uploadfile parts into the local directory named by fs
+class StubRcd(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        expected = base64.b64encode(f"{USER}:{PASSWORD}".encode()).decode()
+        if self.headers.get("Authorization") != f"Basic {expected}":
+            self.reply(401, {"error": "authentication required"})
+            return
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if url.path == "/rc/noop":
+            self.reply(200, {})
+        elif url.path == "/operations/uploadfile":
+            directory = Path(parse_qs(url.query)["fs"][0])
+            message = email.message_from_bytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+                + body,
+                policy=email.policy.HTTP,
+            )
+            for part in message.iter_parts():
+                (directory / part.get_filename()).write_bytes(
+                    part.get_payload(decode=True)
+                )
+            self.reply(200, {})
+        else:
+            self.reply(404, {"error": "couldn't find method"})
+
+    def reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    rclone_rc.get_client.cache_clear()
+    yield
+    rclone_rc.get_client.cache_clear()
+
+
+@pytest.fixture
+def rcd():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubRcd)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def rcat(monkeypatch) -> list[tuple[str, str, bytes]]:
+    calls = []
+
+    def fake_rcat(destination: str, filename: str, data: bytes) -> bool:
+        calls.append((destination, filename, data))
+        return True
+
+    monkeypatch.setattr(rclone_rc, "_rcat", fake_rcat)
+    return calls
+
+
+def upload_config(destination: Path, url: str) -> UploadConfig:
+    return UploadConfig(
+        pictures_dir=destination,
+        thumb_dir=destination,
+        rclone_destination=str(destination),
+        public_base_url="https://example.com",
+        blog_image_dir=destination,
+        rclone_rc_url=url,
+        rclone_rc_user=USER,
+        rclone_rc_pass=PASSWORD,
+    )
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def unused_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def test_upload_goes_through_the_daemon(rcd, rcat, tmp_path):
+    config = upload_config(tmp_path, server_url(rcd))
+    assert rclone_rc.upload_bytes(config, "photo.jpg", b"jpeg bytes")
+    assert (tmp_path / "photo.jpg").read_bytes() == b"jpeg bytes"
+    assert not rcat
+
+
+def test_falls_back_to_rcat_without_a_daemon(rcat, tmp_path):
+    config = upload_config(tmp_path, unused_url())
+    assert rclone_rc.upload_bytes(config, "photo.jpg", b"jpeg bytes")
+    assert rcat == [(str(tmp_path), "photo.jpg", b"jpeg bytes")]
+    assert not (tmp_path / "photo.jpg").exists()
+
+
+def test_daemon_going_away_switches_to_rcat(rcd, rcat, tmp_path):
+    config = upload_config(tmp_path, server_url(rcd))
+    client = rclone_rc.get_client(
+        config.rclone_rc_url, config.rclone_rc_user, config.rclone_rc_pass
+    )
+    assert client.available()
+    rcd.shutdown()
+    rcd.server_close()
+
+    assert rclone_rc.upload_bytes(config, "photo.jpg", b"jpeg bytes")
+    assert rcat == [(str(tmp_path), "photo.jpg", b"jpeg bytes")]
+    assert not client.available()
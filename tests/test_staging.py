@@ -0,0 +1,51 @@
+from pathlib import Path
+import os
+
+from fileops import copy_and_hash
+from staging import Migrator
+
+
+def stage_shot(source: Path, staged_directory: Path) -> list[Path]:
+    staged_directory.mkdir(parents=True, exist_ok=True)
+    raw = source / "DSCF0001.RAF"
+    jpg = source / "DSCF0001.JPG"
+    raw.write_bytes(b"raw" * 1000)
+    jpg.write_bytes(b"jpg" * 1000)
+    raw_copy, sha1 = copy_and_hash(
+        raw, staged_directory, lambda sha1: f"2024_DSCF0001_{sha1}.raf"
+    )
+    jpg_copy, _ = copy_and_hash(
+        jpg, staged_directory, lambda _: f"2024_DSCF0001_{sha1}.jpg"
+    )
+    return [raw_copy, jpg_copy]
+
+
+# A run that died between copying a shot and journaling it
+def test_unjournaled_shot_is_migrated(tmp_path):
+    destination = tmp_path / "photos"
+    migrator = Migrator(tmp_path / "staging")
+    staged = stage_shot(tmp_path, migrator.staged_directory(destination))
+    migrator.close()
+
+    Migrator(tmp_path / "staging").close()
+    assert sorted(path.name for path in destination.iterdir()) == sorted(
+        path.name for path in staged
+    )
+    assert not any(path.exists() for path in staged)
+
+
+def test_corrupt_unjournaled_copy_discards_the_whole_shot(tmp_path):
+    destination = tmp_path / "photos"
+    migrator = Migrator(tmp_path / "staging")
+    staged = stage_shot(tmp_path, migrator.staged_directory(destination))
+    migrator.close()
+    raw_copy = staged[0]
+    stat = raw_copy.stat()
+    with open(raw_copy, "r+b") as f:
+        f.write(b"X")
+    # Keep size and mtime, so only the re-hash can tell
+    os.utime(raw_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    Migrator(tmp_path / "staging").close()
+    assert not destination.exists()
+    assert not any(path.exists() for path in staged)
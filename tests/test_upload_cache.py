@@ -0,0 +1,22 @@
+import sqlite3
+
+from upload_cache import UploadCache
+
+
+def test_cache_of_full_urls_is_dropped(tmp_path):
+    path = tmp_path / "upload_cache.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE uploaded (sha1 TEXT, resize INTEGER, remote TEXT,"
+            " banned_areas TEXT, url TEXT, uploaded_at REAL)"
+        )
+        connection.execute(
+            "INSERT INTO uploaded VALUES"
+            " ('abc', 0, 'remote:', 'areas', 'https://old.example/a.jpg', 0)"
+        )
+    connection.close()
+
+    with UploadCache(path) as cache:
+        assert cache.lookup("abc", None, "remote:", "areas") is None
+        cache.record("abc", None, "remote:", "areas", "a_0123456789abcdef.jpg")
+        assert cache.lookup("abc", None, "remote:", "areas") == "a_0123456789abcdef.jpg"
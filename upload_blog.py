@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
-import shutil
 from pathlib import Path
 
 from config import load_config
-from upload_photo import upload_photo
+from fileops import copy_file
+from upload_photo import local_copy_path, upload_photo
 
 
 def main() -> None:
@@ -13,6 +13,11 @@ def main() -> None:
         description="Upload a photo, copy blog markup to the clipboard, and mirror the processed file locally."
     )
     parser.add_argument("src_file")
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Upload again instead of trusting the upload cache.",
+    )
     args = parser.parse_args()
 
     config = load_config().upload
@@ -20,15 +25,17 @@ def main() -> None:
         args.src_file,
         clipboard=True,
         clipboard_format="pic {url} : ",
+        refresh=args.refresh,
+        local_copy=True,
     )
     dst_filename = full_size_link.rsplit("/", 1)[-1]
-    processed_path = config.thumb_dir / Path(args.src_file).name
+    processed_path = local_copy_path(config, Path(args.src_file))
     if not processed_path.is_file():
         raise SystemExit(f"Processed photo not found at {processed_path}")
 
     config.blog_image_dir.mkdir(parents=True, exist_ok=True)
     dest_file = config.blog_image_dir / dst_filename
-    shutil.copy2(processed_path, dest_file)
+    copy_file(processed_path, dest_file)
 
     output = f"pic {full_size_link} : "
     print(output)
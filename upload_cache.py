@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+import sqlite3
+import time
+
+
+# Remembers the remote filename each file was uploaded as, keyed by the SHA1 of the
+# source file, the size it was resized to (0 for full size), the rclone destination
+# and the digest of the banned areas the upload was scrubbed against, so uploading
+# the same bytes again needs no rclone call at all, while editing banned_areas
+# uploads everything again. The public URL is built from the current config, so
+# changing public_base_url needs no new uploads. Each thread of albumize.py opens
+# its own connection.
+class UploadCache:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30)
+        columns = [
+            row[1] for row in self.connection.execute("PRAGMA table_info(uploaded)")
+        ]
+        if columns and not {"banned_areas", "filename"} <= set(columns):
+            # Written before banned areas were part of the key, so nothing in it can
+            # be trusted to have been scrubbed against the current areas, or holding
+            # full URLs tied to an old public_base_url
+            self.connection.execute("DROP TABLE uploaded")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploaded (
+                sha1 TEXT NOT NULL,
+                resize INTEGER NOT NULL,
+                remote TEXT NOT NULL,
+                banned_areas TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                uploaded_at REAL NOT NULL,
+                PRIMARY KEY (sha1, resize, remote, banned_areas)
+            )
+            """
+        )
+        self.connection.commit()
+
+    def __enter__(self) -> "UploadCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def lookup(
+        self, sha1: str, resize: Optional[int], remote: str, banned_areas: str
+    ) -> Optional[str]:
+        row = self.connection.execute(
+            "SELECT filename FROM uploaded"
+            " WHERE sha1 = ? AND resize = ? AND remote = ? AND banned_areas = ?",
+            (sha1, resize or 0, remote, banned_areas),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def record(
+        self,
+        sha1: str,
+        resize: Optional[int],
+        remote: str,
+        banned_areas: str,
+        filename: str,
+    ) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO uploaded VALUES (?, ?, ?, ?, ?, ?)",
+            (sha1, resize or 0, remote, banned_areas, filename, time.time()),
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
@@ -11,9 +11,18 @@ def main() -> None:
     )
     parser.add_argument("src_file")
     parser.add_argument("resize", nargs="?", type=int)
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Upload again instead of trusting the upload cache.",
+    )
     args = parser.parse_args()
 
-    print(upload_photo(args.src_file, resize=args.resize, clipboard=True))
+    print(
+        upload_photo(
+            args.src_file, resize=args.resize, clipboard=True, refresh=args.refresh
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -29,6 +29,7 @@ from PIL import ExifTags, Image, ImageOps
 
 from config import CommonsConfig, OpenAIConfig, load_config
 from gps import is_in_banned_area
+from resize import downscale
 
 
 Image.MAX_IMAGE_PIXELS = None
@@ -342,11 +343,9 @@ def _read_metadata(image_path: Path) -> PhotoMetadata:
 
 
 def _downsize_image(image_path: Path, max_dimension: int) -> tuple[bytes, str]:
-    with Image.open(image_path) as img:
-        img = ImageOps.exif_transpose(img)
-        img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-        output = BytesIO()
-        img.save(output, format="JPEG", quality=92)
+    img = downscale(image_path, max_dimension)
+    output = BytesIO()
+    img.save(output, format="JPEG", quality=92)
     return output.getvalue(), "image/jpeg"
 
 
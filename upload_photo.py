@@ -1,15 +1,20 @@
 import argparse
 import hashlib
 import os
-import shutil
 import subprocess
 import sys
+from io import BytesIO
 from pathlib import Path
 
-from PIL import Image, ImageOps
+from PIL import Image
 
 from config import load_config
-from gps import remove_gps_if_banned
+from fileops import sha1sum
+from exif import ExifError
+from gps import get_banned_area_index, remove_gps_from_buffer_if_banned
+from rclone_rc import upload_bytes
+from resize import downscale
+from upload_cache import UploadCache
 
 Image.MAX_IMAGE_PIXELS = None  # suppress stupid decompression bomb warning
 
@@ -34,50 +39,107 @@ def copy_to_clipboard(text: str) -> bool:
     return True
 
 
-def upload_photo(src_file, resize=None, clipboard=False, clipboard_format=None):
-    config = load_config().upload
-    src_path = Path(src_file)
-    thumb_path = config.thumb_dir
-    thumb_path.mkdir(exist_ok=True, parents=True)
+def _copy_url_to_clipboard(dst_url, clipboard, clipboard_format):
+    if clipboard or clipboard_format is not None:
+        clipboard_text = (
+            dst_url
+            if clipboard_format is None
+            else clipboard_format.format(url=dst_url)
+        )
+        if not copy_to_clipboard(clipboard_text):
+            raise SystemExit(1)
+
+
+# Where the processed photo is kept when a local copy is asked for
+def local_copy_path(config, src_path, resize=None):
+    if resize:
+        return config.thumb_dir / f"{src_path.stem}_{resize}{src_path.suffix}"
+    return config.thumb_dir / src_path.name
 
-    filename = src_path.name
+
+# Resize (or read) the photo into memory, strip GPS in the buffer, hash the buffer
+# and hand it to rclone (the rcd daemon if one is running, rclone rcat otherwise),
+# so the bytes are never written to disk unless a local copy is asked for
+def _process_and_upload(
+    config, src_path, src_sha1, resize, clipboard, clipboard_format, local_path
+):
     filename_no_ext = src_path.stem
     ext = src_path.suffix
 
     if resize:
-        img = Image.open(src_file)
-        img = ImageOps.exif_transpose(img)
-        img.thumbnail((resize, resize), Image.Resampling.LANCZOS)
+        img = downscale(src_path, resize)
+        output = BytesIO()
+        img.save(output, format=Image.registered_extensions()[ext.lower()], quality=95)
+        buffer = output.getbuffer()
+    else:
+        buffer = bytearray(src_path.read_bytes())
 
-        resized_filename = f"{filename_no_ext}_{resize}{ext}"
-        upload_src = thumb_path / resized_filename  # Temporary file path
+    try:
+        buffer, gps_banned = remove_gps_from_buffer_if_banned(buffer, ext)
+    except ExifError as e:
+        # Never upload a photo whose location could not be checked
+        print(f"Error: {src_path}: {e}. Not uploaded.", file=sys.stderr)
+        raise SystemExit(1)
+
+    # Calculate SHA1 checksum; an untouched full-size photo has the digest that
+    # import cached on the original
+    sha1 = hashlib.sha1(buffer).hexdigest() if resize or gps_banned else src_sha1
+    dst_filename = f"{filename_no_ext}_{sha1[:16]}{ext}"
 
-        img.save(upload_src, quality=95)
+    if local_path is not None:
+        local_path.parent.mkdir(exist_ok=True, parents=True)
+        local_path.write_bytes(buffer)
 
-    else:
-        upload_src = thumb_path / filename  # Temporary file path
-        shutil.copyfile(src_path, upload_src)
+    _copy_url_to_clipboard(
+        f"{config.public_base_url}/{dst_filename}", clipboard, clipboard_format
+    )
+    return dst_filename, upload_bytes(config, dst_filename, buffer)
 
-    gps_banned = remove_gps_if_banned(upload_src)
 
-    # Calculate SHA1 checksum
-    with open(upload_src, "rb") as f:
-        sha1 = hashlib.sha1(f.read()).hexdigest()
-    dst_filename = f"{filename_no_ext}_{sha1[:16]}{ext}"
-    dst = f"{config.rclone_destination}/{dst_filename}"
+def upload_photo(
+    src_file,
+    resize=None,
+    clipboard=False,
+    clipboard_format=None,
+    refresh=False,
+    local_copy=False,
+):
+    config = load_config().upload
+    src_path = Path(src_file)
 
-    # Upload file, skipping if it already exists remotely
-    dst_url = f"{config.public_base_url}/{dst_filename}"
-    if clipboard or clipboard_format is not None:
-        clipboard_text = (
-            dst_url
-            if clipboard_format is None
-            else clipboard_format.format(url=dst_url)
+    # Bytes that were uploaded before, and scrubbed against the same banned areas,
+    # are answered from the upload cache without resizing or calling rclone; the
+    # source digest is usually cached by import.
+    # refresh uploads again and updates the cache. local_copy also saves the
+    # processed photo in thumb_dir, and bypasses the cache if that copy is missing.
+    src_sha1 = sha1sum(src_path)
+    local_path = local_copy_path(config, src_path, resize) if local_copy else None
+    cache_key = (
+        src_sha1,
+        resize,
+        config.rclone_destination,
+        get_banned_area_index().digest,
+    )
+    with UploadCache(config.upload_cache_path) as cache:
+        if not refresh and (local_path is None or local_path.is_file()):
+            dst_filename = cache.lookup(*cache_key)
+            if dst_filename is not None:
+                dst_url = f"{config.public_base_url}/{dst_filename}"
+                _copy_url_to_clipboard(dst_url, clipboard, clipboard_format)
+                return dst_url
+
+        dst_filename, uploaded = _process_and_upload(
+            config,
+            src_path,
+            src_sha1,
+            resize,
+            clipboard,
+            clipboard_format,
+            local_path,
         )
-        if not copy_to_clipboard(clipboard_text):
-            raise SystemExit(1)
-    subprocess.run(["rclone", "copyto", "--ignore-existing", upload_src, dst])
-    return dst_url
+        if uploaded:
+            cache.record(*cache_key, dst_filename)
+    return f"{config.public_base_url}/{dst_filename}"
 
 
 if __name__ == "__main__":
@@ -95,6 +157,11 @@ if __name__ == "__main__":
         "--clipboard-format",
         help="Format string for clipboard text (use {url}). Implies --clipboard.",
     )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Upload again instead of trusting the upload cache.",
+    )
     args = parser.parse_args()
 
     dst = upload_photo(
@@ -102,5 +169,6 @@ if __name__ == "__main__":
         resize=args.resize,
         clipboard=args.clipboard or args.clipboard_format is not None,
         clipboard_format=args.clipboard_format,
+        refresh=args.refresh,
     )
     print(dst)